@@ -0,0 +1,67 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+配置读取基准测试：原来每次调用都打开并解析 YAML，对比按 mtime 缓存后的单次调用耗时
+运行：python -m benchmarks.bench_config
+"""
+
+import os
+import tempfile
+import time
+
+import yaml
+
+from config.config import Config
+
+CALLS = 20000
+LEGACY_CALLS = 500
+
+
+def build_config(path):
+    config = {
+        "base_url": "http://127.0.0.1:8000/",
+        "static_url": "http://127.0.0.1:8000/static/",
+        "bot_wxid": "wxid_bot",
+        "queue_timer_random": [1, 3],
+        "forward_url": [f"http://127.0.0.1:{9000 + i}/" for i in range(3)],
+        "gk_remind": [f"{i}@chatroom" for i in range(20)],
+        "welcome_msg": {f"{i}@chatroom": f"欢迎加入{i}群" * 5 for i in range(50)},
+        "command_manul": [f"指令{i}" for i in range(80)],
+        "pan_share": [f"https://pan.example.com/s/{i}" for i in range(30)],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.dump(config, f, allow_unicode=True)
+
+
+def legacy_get_config(path, key):
+    with open(path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    return config[key]
+
+
+def run(label, func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    per_call = (time.perf_counter() - start) / calls * 1e6
+    print(f"{label:<28} {per_call:>10.1f}us/call")
+    return per_call
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "config.yaml")
+        build_config(path)
+        config = Config()
+        print(f"config.yaml {os.path.getsize(path)} bytes")
+        legacy = run("legacy get_config", lambda: legacy_get_config(path, "base_url"), LEGACY_CALLS)
+        cached = run("cached get_config (str)", lambda: config.get_config("base_url", path), CALLS)
+        run("cached get_config (list)", lambda: config.get_config("forward_url", path), CALLS)
+        run("cached get_str", lambda: config.get_str("base_url", "", path), CALLS)
+        print(f"speedup {legacy / cached:.0f}x")
+        config.modify_config("base_url", "http://127.0.0.1:8001/", path)
+        assert config.get_config("base_url", path) == "http://127.0.0.1:8001/"
+
+
+if __name__ == "__main__":
+    main()
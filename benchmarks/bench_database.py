@@ -0,0 +1,145 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+SQLite 并发基准测试：多个线程模拟 webhook 写入 messages，同时一个线程模拟队列消费
+对比原来的每次操作新建连接（默认 rollback journal）与 database 连接池（WAL + PRAGMAS）
+运行：python -m benchmarks.bench_database
+"""
+
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from database import ConnectionPool
+
+WRITERS = 8
+INSERTS_PER_WRITER = 300
+QUEUE_ROWS = 1000
+
+MESSAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS messages(
+    id INTEGER PRIMARY KEY autoincrement, wxid TEXT, msg_id TEXT, type INTEGER,
+    sender TEXT, roomid TEXT, content TEXT, thumb TEXT, ext TEXT, is_at BOOLEAN,
+    is_self BOOLEAN, is_group BOOLEAN, create_time INTEGER)
+"""
+QUEUES_TABLE = """
+CREATE TABLE IF NOT EXISTS queues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, is_consumed BOOLEAN DEFAULT 0, msg_id TEXT,
+    data TEXT, producer TEXT, p_time TEXT, consumer TEXT, c_time TEXT, timestamp INTEGER)
+"""
+
+
+class Legacy:
+    """原来的用法：每次操作 sqlite3.connect，用完 close"""
+
+    @staticmethod
+    def acquire(db):
+        return sqlite3.connect(db)
+
+    @staticmethod
+    def finish(conn):
+        conn.close()
+
+
+class Pooled:
+    def __init__(self):
+        self.pool = ConnectionPool()
+
+    def acquire(self, db):
+        return self.pool.connect(db)
+
+    def finish(self, conn):
+        self.pool.release(conn)
+
+
+def prepare(root):
+    messages = os.path.join(root, "messages.db")
+    queues = os.path.join(root, "queues.db")
+    with sqlite3.connect(messages) as conn:
+        conn.execute(MESSAGES_TABLE)
+    with sqlite3.connect(queues) as conn:
+        conn.execute(QUEUES_TABLE)
+        conn.executemany(
+            "INSERT INTO queues (data, consumer, timestamp) VALUES (?, ?, ?)",
+            [("{}", "api", i) for i in range(QUEUE_ROWS)],
+        )
+    return messages, queues
+
+
+def writer(mode, db, n, latencies, errors):
+    for i in range(n):
+        t = time.perf_counter()
+        try:
+            conn = mode.acquire(db)
+            conn.execute(
+                "INSERT INTO messages(wxid, msg_id, type, sender, roomid, content, create_time) "
+                "VALUES (?, ?, 1, ?, ?, ?, ?)",
+                ("bot", f"{threading.get_ident()}-{i}", "wxid_x", "1@chatroom", "消息" * 20, int(time.time())),
+            )
+            conn.commit()
+            mode.finish(conn)
+        except sqlite3.OperationalError:
+            errors.append(1)
+        latencies.append((time.perf_counter() - t) * 1e6)
+
+
+def consumer(mode, db, stop, consumed, errors):
+    while not stop.is_set():
+        try:
+            conn = mode.acquire(db)
+            row = conn.execute(
+                "SELECT * FROM queues WHERE is_consumed = 0 ORDER BY timestamp ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                mode.finish(conn)
+                break
+            conn.execute("UPDATE queues SET is_consumed = 1, c_time = ? WHERE id = ?", ("now", row[0]))
+            conn.commit()
+            mode.finish(conn)
+            consumed.append(1)
+        except sqlite3.OperationalError:
+            errors.append(1)
+
+
+def run(label, mode):
+    with tempfile.TemporaryDirectory() as root:
+        messages, queues = prepare(root)
+        latencies, errors, consumed = [], [], []
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=writer, args=(mode, messages, INSERTS_PER_WRITER, latencies, errors))
+            for _ in range(WRITERS)
+        ]
+        queue_thread = threading.Thread(target=consumer, args=(mode, queues, stop, consumed, errors))
+        start = time.perf_counter()
+        queue_thread.start()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        inserts_elapsed = time.perf_counter() - start
+        stop.set()
+        queue_thread.join()
+        latencies.sort()
+        print(
+            f"{label:<8} inserts {len(latencies) / inserts_elapsed:>8.0f}/s  "
+            f"p50 {statistics.median(latencies):>8.0f}us  "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:>8.0f}us  "
+            f"queue {len(consumed) / inserts_elapsed:>7.0f}/s  "
+            f"locked {len(errors)}"
+        )
+        if isinstance(mode, Pooled):
+            mode.pool.close_all()
+
+
+def main():
+    print(f"{WRITERS} writers x {INSERTS_PER_WRITER} inserts, 1 queue consumer")
+    run("legacy", Legacy())
+    run("pooled", Pooled())
+
+
+if __name__ == "__main__":
+    main()
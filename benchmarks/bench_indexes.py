@@ -0,0 +1,101 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+索引迁移基准测试：1M 行 messages 表按 msg_id 查询、20 万行 queues 表取最早未消费消息
+对比执行 database.migrate 前后的查询耗时和查询计划
+运行：python -m benchmarks.bench_indexes
+"""
+
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+
+MESSAGE_ROWS = 1_000_000
+QUEUE_ROWS = 200_000
+UNCONSUMED = 50
+
+
+def build(root):
+    messages = os.path.join(root, "messages.db")
+    queues = os.path.join(root, "queues.db")
+    with sqlite3.connect(messages) as conn:
+        conn.execute(
+            """CREATE TABLE messages(
+            id INTEGER PRIMARY KEY autoincrement, wxid TEXT, msg_id TEXT, type INTEGER,
+            sender TEXT, roomid TEXT, content TEXT, thumb TEXT, ext TEXT, is_at BOOLEAN,
+            is_self BOOLEAN, is_group BOOLEAN, create_time INTEGER)"""
+        )
+        conn.executemany(
+            "INSERT INTO messages(wxid, msg_id, type, sender, roomid, content, create_time) VALUES ('bot', ?, 1, 'wxid_x', '1@chatroom', '今天下午开会', ?)",
+            ((str(7_000_000_000 + i), i) for i in range(MESSAGE_ROWS)),
+        )
+    with sqlite3.connect(queues) as conn:
+        conn.execute(
+            """CREATE TABLE queues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, is_consumed BOOLEAN DEFAULT 0, msg_id TEXT,
+            data TEXT, producer TEXT, p_time TEXT, consumer TEXT, c_time TEXT, timestamp INTEGER)"""
+        )
+        conn.executemany(
+            "INSERT INTO queues (is_consumed, data, consumer, timestamp) VALUES (?, '{}', 'api', ?)",
+            ((0 if i >= QUEUE_ROWS - UNCONSUMED else 1, i) for i in range(QUEUE_ROWS)),
+        )
+    return messages, queues
+
+
+def measure(label, conn, sql, params_list):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params_list[0]).fetchall()
+    latencies = []
+    for params in params_list:
+        t = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        latencies.append((time.perf_counter() - t) * 1e6)
+    print(
+        f"{label:<22} p50 {statistics.median(latencies):>10.1f}us  "
+        f"max {max(latencies):>10.1f}us  plan: {' / '.join(p[-1] for p in plan)}"
+    )
+
+
+def run(messages, queues, lookups):
+    random.seed(7)
+    ids = [(str(7_000_000_000 + random.randrange(MESSAGE_ROWS)),) for _ in range(lookups)]
+    conn = database.connect(messages)
+    measure("select by msg_id", conn, "SELECT * FROM messages WHERE msg_id = ?", ids)
+    conn = database.connect(queues)
+    measure(
+        "oldest unconsumed",
+        conn,
+        "SELECT * FROM queues WHERE is_consumed = 0 ORDER BY timestamp ASC LIMIT 1",
+        [()] * lookups,
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        t = time.perf_counter()
+        messages, queues = build(root)
+        print(f"{MESSAGE_ROWS} messages / {QUEUE_ROWS} queues built in {time.perf_counter() - t:.1f}s")
+        print("-- before")
+        run(messages, queues, 20)
+        database.register_migration(
+            messages, 1, "msg_id", ["CREATE INDEX IF NOT EXISTS idx_messages_msg_id ON messages(msg_id)"]
+        )
+        database.register_migration(
+            queues,
+            1,
+            "unconsumed",
+            ["CREATE INDEX IF NOT EXISTS idx_queues_unconsumed ON queues(timestamp) WHERE is_consumed = 0"],
+        )
+        t = time.perf_counter()
+        assert database.migrate()
+        print(f"-- after (migrate {time.perf_counter() - t:.1f}s)")
+        run(messages, queues, 2000)
+        database.close_all()
+
+
+if __name__ == "__main__":
+    main()
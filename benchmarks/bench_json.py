@@ -0,0 +1,66 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+消息接收的 JSON 开销基准测试：每条消息解析请求体、转发、写入发送队列的 CPU 耗时
+legacy：json.loads 请求体 + process_nested_dict 遍历 + json.dumps 转发 + json.dumps 队列数据
+codec：jsoncodec.loads 请求体 + 原始字节转发 + jsoncodec.dumps 队列数据（WxMsg 按需解析 content）
+运行：python -m benchmarks.bench_json
+"""
+
+import json
+import time
+
+import jsoncodec
+from benchmarks.bench_wxmsg import build_messages
+from wxmsg import process_nested_dict
+
+MESSAGES = 10000
+
+
+def reply(i):
+    return {
+        "friend_id": f"{i % 50}@chatroom",
+        "message": f"收到第{i}条消息，课表已更新，请查看附件。" * 3,
+        "remark": f"wxid_{i % 200}",
+        "content_type": 1,
+    }
+
+
+def legacy(raw, i):
+    body = json.loads(raw)
+    process_nested_dict(body)
+    json.dumps(body)
+    json.dumps(reply(i), ensure_ascii=False)
+
+
+def codec(raw, i):
+    body = jsoncodec.loads(raw)
+    # 转发使用原始字节，不需要重新编码
+    content = body["content"]
+    if isinstance(content, str) and content.startswith("{"):
+        jsoncodec.loads(content)
+    jsoncodec.dumps(reply(i))
+
+
+def run(label, func, bodies):
+    start = time.process_time()
+    for i, raw in enumerate(bodies):
+        func(raw, i)
+    elapsed = time.process_time() - start
+    print(f"{label:<8} {elapsed / len(bodies) * 1e6:>6.1f}us/msg CPU")
+    return elapsed
+
+
+def main():
+    bodies = [
+        json.dumps(msg, ensure_ascii=False).encode("utf-8")
+        for msg in build_messages(MESSAGES)
+    ]
+    print(f"jsoncodec backend: {jsoncodec.BACKEND}")
+    base = run("legacy", legacy, bodies)
+    fast = run("codec", codec, bodies)
+    print(f"speedup {base / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+触发规则匹配基准测试：1k 条规则下每秒可处理的消息数及单条消息匹配耗时
+运行：python -m benchmarks.bench_rules
+"""
+
+import random
+import re
+import sqlite3
+import statistics
+import time
+from types import SimpleNamespace
+
+from rules import RuleEngine
+
+RULES = 1000
+MESSAGES = 2000
+LEGACY_MESSAGES = 200  # 基线太慢，只取前 200 条
+
+
+def build_db(n_rules=RULES):
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE permission(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            func TEXT, func_name TEXT, activate BOOLEAN DEFAULT 1,
+            black_list TEXT, white_list TEXT, type TEXT, pattern TEXT,
+            keywords TEXT, ai_flag BOOLEAN DEFAULT 0, need_at BOOLEAN DEFAULT 0,
+            reply TEXT, module TEXT, level INTEGER DEFAULT 1, example TEXT,
+            check_permission BOOLEAN DEFAULT 0, score INTEGER DEFAULT 0,
+            balance INTEGER DEFAULT 0, create_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT)
+        """
+    )
+    patterns = [
+        r"^指令{i}(-\d+)?$",
+        "^关键词{i}$",
+        "^(查询|获取){i}号",
+        "提醒{i}.*",
+    ]
+    rows = []
+    for i in range(n_rules):
+        white = "all" if i % 3 else "/".join(f"{j}@chatroom" for j in range(i % 7, 20, 3))
+        rows.append(
+            (
+                f"func_{i}",
+                f"功能{i}",
+                0 if i % 50 == 0 else 1,
+                f"{i % 11}@chatroom",
+                white,
+                "1" if i % 4 else "",
+                patterns[i % len(patterns)].format(i=i),
+                "",
+                0,
+                1 if i % 10 == 0 else 0,
+                "",
+            )
+        )
+    conn.executemany(
+        """INSERT INTO permission (func, func_name, activate, black_list, white_list,
+        type, pattern, keywords, ai_flag, need_at, reply) VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
+        rows,
+    )
+    conn.commit()
+    return conn
+
+
+def build_messages(n=MESSAGES, n_rules=RULES):
+    random.seed(7)
+    msgs = []
+    for _ in range(n):
+        r = random.random()
+        i = random.randrange(n_rules)
+        if r < 0.2:
+            content = f"指令{i}"
+        elif r < 0.3:
+            content = f"关键词{i}"
+        elif r < 0.4:
+            content = f"查询{i}号的课表"
+        elif r < 0.5:
+            content = f"明天八点提醒{i}开会"
+        else:
+            content = "大家好，今天下午的会议改到三点"
+        msgs.append(
+            SimpleNamespace(
+                type=1,
+                roomid=f"{random.randrange(20)}@chatroom",
+                is_at=random.random() < 0.2,
+                content=content,
+            )
+        )
+    return msgs
+
+
+def legacy_trigger(conn, msg):
+    """基线：与原 main.trigger 相同，每条消息查询并逐条 re.search"""
+    rules = conn.execute("SELECT * FROM permission").fetchall()
+    for rule in rules:
+        if rule[3] == 0:
+            continue
+        msg_type = rule[6] if rule[6] else "all"
+        blacklist = rule[4].split("/") if rule[4] else []
+        whitelist = rule[5].split("/") if rule[5] else []
+        if msg_type != "all" and str(msg_type) != str(msg.type):
+            continue
+        if rule[10] and not msg.is_at:
+            continue
+        if msg.roomid in blacklist:
+            continue
+        if whitelist != ["all"] and msg.roomid not in whitelist:
+            continue
+        if re.search(rule[7] or "", msg.content, re.DOTALL):
+            return rule[1]
+    return None
+
+
+# 反向引用、条件分组等不能合并的模式，与普通模式混在一起检查两种模式结果一致
+SPECIAL_PATTERNS = [
+    r"(a)(?(1)b|c)",
+    r"(?P<x>a)?(?(x)b|c)d",
+    r"^(\w)\1",
+    r"(?P<w>\w)(?P=w)",
+    r"(?i)hello",
+    r"^(查询|获取)(\d+)号",
+    r"x(y)?(?(1)z|w)",
+    "^指令1$",
+    "提醒.*",
+]
+SPECIAL_CONTENTS = [
+    "ab", "ac", "cd", "bd", "abd", "aa", "好好", "HELLO",
+    "获取3号", "xw", "xyz", "xyw", "指令1", "明天提醒", "ccb",
+]
+
+
+def check_special_patterns():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE permission(id INTEGER PRIMARY KEY, func TEXT, func_name TEXT, "
+        "activate BOOLEAN, black_list TEXT, white_list TEXT, type TEXT, pattern TEXT, "
+        "keywords TEXT, ai_flag BOOLEAN, need_at BOOLEAN, reply TEXT)"
+    )
+    # 每个模式放在不同位置，排在前面的会被合并进同一个正则
+    for i, pattern in enumerate(SPECIAL_PATTERNS * 2):
+        conn.execute(
+            "INSERT INTO permission VALUES (?,?,?,1,'','all','',?,'',0,0,'')",
+            (i + 1, f"func_{i}", f"功能{i}", pattern),
+        )
+    loader = lambda: conn.execute("SELECT * FROM permission").fetchall()
+    sequential = RuleEngine(loader)
+    combined = RuleEngine(loader, combined=True)
+    for content in SPECIAL_CONTENTS:
+        msg = SimpleNamespace(type=1, roomid="1@chatroom", is_at=False, content=content)
+        expected = sequential.match(msg)
+        actual = combined.match(msg)
+        assert (expected and expected.func) == (actual and actual.func), content
+    print(f"combined matches sequential on {len(SPECIAL_PATTERNS)} special patterns")
+
+
+def run(label, func, msgs):
+    results = []
+    latencies = []
+    start = time.perf_counter()
+    for m in msgs:
+        t = time.perf_counter()
+        rule = func(m)
+        latencies.append((time.perf_counter() - t) * 1e6)
+        results.append(rule if isinstance(rule, str) or rule is None else rule.func)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{label:<12} {len(msgs) / elapsed:>10.0f} msg/s  "
+        f"p50 {statistics.median(latencies):>9.1f}us  "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:>9.1f}us  "
+        f"({sum(r is not None for r in results)} hits)"
+    )
+    return results
+
+
+def main():
+    check_special_patterns()
+    conn = build_db()
+    msgs = build_messages()
+    loader = lambda: conn.execute("SELECT * FROM permission").fetchall()
+    sequential = RuleEngine(loader)
+    combined = RuleEngine(loader, combined=True)
+    for engine in (sequential, combined):  # 预热：加载规则并建立索引
+        for m in msgs:
+            engine.match(m)
+    print(f"{RULES} rules, {MESSAGES} messages")
+    legacy = run("legacy", lambda m: legacy_trigger(conn, m), msgs[:LEGACY_MESSAGES])
+    result = run("sequential", sequential.match, msgs)
+    assert result[:LEGACY_MESSAGES] == legacy
+    assert run("combined", combined.match, msgs) == result
+
+
+if __name__ == "__main__":
+    main()
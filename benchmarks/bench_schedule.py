@@ -0,0 +1,142 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+课表格式化基准测试，同时检查与原来逐个单元格处理的结果一致
+模板的 replace 表包含链式（（ -> ( -> [）和有重叠（b 在 ab 之前）的规则
+legacy：原来的三次 DataFrame.map；vectorized：Lesson.format_schedule(DataFrame)；
+memo：Lesson.format_schedule(课表文件路径)，命中缓存
+运行：python -m benchmarks.bench_schedule
+"""
+
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from models.lesson.lesson import Lesson
+
+REPLACE = [("（", "("), ("(", "["), ("）", ")"), ("，", ","), ("b", "B"), ("ab", "X"), ("／", "/")]
+IGNORE = ["班会", "自习"]
+SUBJECTS = ["语文", "数学", "英语", "物理", "班会", "自习", "ab", "abc"]
+
+
+def build_files(root):
+    template = os.path.join(root, "checkTemplate.xlsx")
+    with pd.ExcelWriter(template, engine="openpyxl") as writer:
+        pd.DataFrame(REPLACE, columns=["string", "replace"]).to_excel(
+            writer, sheet_name="replace", index=False
+        )
+        pd.DataFrame({"subject": IGNORE}).to_excel(writer, sheet_name="ignore", index=False)
+        pd.DataFrame({"name": ["张三"], "subject": ["语文"]}).to_excel(
+            writer, sheet_name="teachers", index=False
+        )
+
+    random.seed(0)
+
+    def cell():
+        r = random.random()
+        a, b = random.sample(SUBJECTS, 2)
+        if r < 0.1:
+            return None
+        if r < 0.3:
+            return f" {a}（单）／{b}（双） "
+        if r < 0.4:
+            return f"{a}(双)/{b}(单)"
+        if r < 0.5:
+            return f"{a}\t，{b}"
+        return random.choice(SUBJECTS) + random.choice(["", " ", "\n"])
+
+    rows = []
+    for week in range(1, 6):
+        for order in range(1, 10):
+            row = {"date": 10 + week, "week": week, "order": f"第{order}节", "diff": week - 1}
+            row.update({f"高一{c}班": cell() for c in range(60)})
+            rows.append(row)
+    schedule = os.path.join(root, "课表.xlsx")
+    pd.DataFrame(rows).to_excel(schedule, index=False, engine="openpyxl")
+    return schedule
+
+
+def legacy_format(df_schedule, week_flag, ignore):
+    """原来的 format_schedule"""
+    df_schedule = df_schedule.fillna("-")
+    replace_dict = dict(REPLACE)
+    pattern = re.compile(r"[\s\n\r\t]+")
+
+    def clean_string(x):
+        if not isinstance(x, str):
+            return x
+        result = pattern.sub("", str(x).strip())
+        for old, new in replace_dict.items():
+            if old in result:
+                result = result.replace(old, new)
+        return result.strip()
+
+    df_schedule = df_schedule.map(clean_string)
+    if ignore:
+        df_schedule = df_schedule.map(lambda x: "-" if x in IGNORE else x)
+
+    def process_week_schedule(x):
+        if not isinstance(x, str):
+            return x
+        subjects = x.split("/")
+        if len(subjects) == 2:
+            for subject in subjects:
+                if f"({week_flag})" in subject:
+                    return subject.replace(f"({week_flag})", "").strip()
+        return x
+
+    return df_schedule.map(process_week_schedule)
+
+
+def make_lesson(root, current_week):
+    # 只设置格式化需要的属性，不需要 config.yaml 和浏览器
+    lesson = object.__new__(Lesson)
+    lesson.lesson_dir = root
+    lesson.week_info = [current_week]
+    lesson._regex_patterns = {"clean_string": re.compile(r"[\s\n\r\t]+")}
+    lesson._schedule_cache = OrderedDict()
+    lesson._schedule_lock = threading.Lock()
+    return lesson
+
+
+def timed(label, func, n=20):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    elapsed = (time.perf_counter() - start) / n
+    print(f"{label:<10} {elapsed * 1000:>7.2f}ms")
+    return elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        schedule = build_files(root)
+        raw = pd.read_excel(schedule, engine="openpyxl")
+        for current_week in (3, 4):
+            lesson = make_lesson(root, current_week)
+            for week_next in (False, True):
+                for ignore in (False, True):
+                    expected = legacy_format(raw, lesson._week_flag(week_next), ignore)
+                    for source in (raw, schedule):
+                        actual = lesson.format_schedule(source, week_next, ignore)
+                        assert (
+                            actual.astype(object).values.tolist()
+                            == expected.astype(object).values.tolist()
+                        ), (current_week, week_next, ignore, type(source))
+        print("output matches legacy format_schedule")
+
+        lesson = make_lesson(root, 3)
+        base = timed("legacy", lambda: legacy_format(raw, "单", True))
+        fast = timed("vectorized", lambda: lesson.format_schedule(raw, ignore=True))
+        memo = timed("memo", lambda: lesson.format_schedule(schedule, ignore=True))
+        print(f"vectorized {base / fast:.1f}x, memo {base / memo:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
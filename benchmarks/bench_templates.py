@@ -0,0 +1,87 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+checkTemplate.xlsx 冷启动基准测试
+legacy：每个 sheet 单独 pd.read_excel（teachers 在 Lesson 和 datas_api 中共读 3 次）
+bundle：打开一次工作簿读取所有 sheet；snapshot：重启后从 .snapshot 快照读取
+运行：python -m benchmarks.bench_templates
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from models.lesson.workbook import TemplateBundle, WorkbookCache
+
+SHEETS = ("teachers", "teachers", "teachers", "class", "class_time", "replace", "ignore", "repeated")
+
+
+def build_template(path):
+    random.seed(0)
+    subjects = ["语文", "数学", "英语", "物理", "化学", "生物", "历史", "地理", "政治"]
+    sheets = {
+        "teachers": pd.DataFrame(
+            {
+                "name": [f"老师{i}" for i in range(300)],
+                "subject": ["/".join(random.sample(subjects, 2)) for _ in range(300)],
+                "pwd": [str(100000 + i) for i in range(300)],
+                "active": [1] * 300,
+            }
+        ),
+        "class": pd.DataFrame(
+            {
+                "class_name": [f"高一{i}班" for i in range(60)],
+                "class_en": [f"g1c{i}" for i in range(60)],
+                "class_code": [202400 + i for i in range(60)],
+                "active": [1] * 60,
+            }
+        ),
+        "class_time": pd.DataFrame(
+            {
+                "label": [f"第{i}节" for i in range(15)],
+                "show_time": [f"{7 + i}:00-{7 + i}:40" for i in range(15)],
+            }
+        ),
+        "replace": pd.DataFrame(
+            {"string": [f"，{i}" for i in range(80)], "replace": [f",{i}" for i in range(80)]}
+        ),
+        "ignore": pd.DataFrame({"subject": [f"活动{i}" for i in range(20)]}),
+        "repeated": pd.DataFrame({"subject": [f"连堂{i}" for i in range(20)]}),
+    }
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1000:>8.1f}ms")
+    return elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "checkTemplate.xlsx")
+        build_template(path)
+
+        def legacy():
+            for sheet in SHEETS:
+                pd.read_excel(path, sheet_name=sheet, engine="openpyxl")
+
+        def bundle():
+            TemplateBundle(path, os.stat(path), WorkbookCache().read(path, sheet_name=None))
+
+        base = timed("legacy", legacy)
+        # 第一次同时写入快照
+        once = timed("bundle", bundle)
+        snapshot = timed("snapshot", bundle)
+        print(f"bundle {base / once:.1f}x, snapshot {base / snapshot:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+消息解析基准测试：1 万条混合类型消息的解析耗时和内存分配
+legacy：原来的流程，先用 process_nested_dict 遍历整个消息再全部解析
+lazy：只解析消息头；lazy+decode：解析消息头后再访问 content（触发完整解析）
+运行：python -m benchmarks.bench_wxmsg
+"""
+
+import copy
+import json
+import random
+import time
+import tracemalloc
+
+from wxmsg import WxMsg, filter_msg
+
+MESSAGES = 10000
+
+INNER = {
+    "Title": "期中考试安排.xlsx",
+    "Thumb": "http://127.0.0.1/thumb.jpg",
+    "title": "引用",
+    "displayName": "张老师",
+    "content": "收到",
+    "Source": "小程序",
+    "TypeStr": "文件",
+}
+
+
+def build_messages(n=MESSAGES):
+    random.seed(0)
+    messages = []
+    for i in range(n):
+        room = f"{i % 50}@chatroom" if i % 3 else f"wxid_{i % 200}"
+        msg_type = random.choice([1, 1, 1, 1, 2, 3, 6, 8, 13, 22, 26])
+        if msg_type == 1:
+            content = f"wxid_{i % 200}:\n第{i}条消息 @bot" if i % 3 else f"第{i}条消息"
+        else:
+            content = json.dumps(INNER, ensure_ascii=False)
+            if i % 3:
+                content = f"wxid_{i % 200}:{content}"
+        messages.append(
+            {
+                "wechatid": "wxid_bot",
+                "friendid": room,
+                "issend": "false",
+                "content": content,
+                "contenttype": msg_type,
+                "msgsvrid": str(10**12 + i),
+                "createTime": 1700000000000 + i,
+                "ext": json.dumps({"wxid_bot": 1}) if i % 7 == 0 else "",
+            }
+        )
+    return messages
+
+
+def legacy(payload):
+    msg = WxMsg(filter_msg(payload))
+    msg.content
+    return msg
+
+
+def lazy(payload):
+    return WxMsg(payload)
+
+
+def lazy_decode(payload):
+    msg = WxMsg(payload)
+    msg.content
+    return msg
+
+
+def run(label, func, messages):
+    payloads = copy.deepcopy(messages)
+    start = time.perf_counter()
+    for payload in payloads:
+        func(payload)
+    elapsed = time.perf_counter() - start
+    # 内存单独测一遍，tracemalloc 会显著拖慢解析
+    payloads = copy.deepcopy(messages)
+    tracemalloc.start()
+    kept = [func(payload) for payload in payloads]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<14} {elapsed * 1000:>8.1f}ms/{len(kept)} "
+        f"{elapsed / len(kept) * 1e6:>6.1f}us/msg "
+        f"retained {current / len(kept):>6.0f}B/msg peak {peak / 1024:>7.0f}KB"
+    )
+    return elapsed
+
+
+def main():
+    messages = build_messages()
+    base = run("legacy", legacy, messages)
+    envelope = run("lazy", lazy, messages)
+    full = run("lazy+decode", lazy_decode, messages)
+    print(f"envelope speedup {base / envelope:.1f}x, full decode {base / full:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,23 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import json
 import logging
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from time import sleep
 from typing import Optional, Dict, Any, Union
 
-import requests
+import httpx
 from config.config import Config
+from transport import transport
+
+# 下载文件时每次写入的字节数
+CHUNK_SIZE = 64 * 1024
 
 logging.basicConfig(
     level="DEBUG",
@@ -54,16 +64,15 @@ class Client:
                 "Authorization": f"Bearer {token}",
             }
 
-            response = requests.post(
+            response = transport.post(
                 self.base_url + endpoint,
                 headers=headers,
                 data=data,
                 params=params,
-                timeout=30,
             )
             response.raise_for_status()
             return response.content.decode("utf-8")
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             error_message = f"HTTP Request failed: {e}"
             self.LOG.error(error_message)
             print(error_message)
@@ -140,99 +149,193 @@ class Client:
         }
         return self._make_request("send_message_250514.html", data)
 
-    def down_file(self, msg_id) -> str:
-        """下载文件"""
+    async def _amake_request(
+        self, endpoint: str, data: Dict[str, Any], params: Dict[str, Any] = None
+    ) -> Union[str, int]:
+        """_make_request 的异步版本"""
         token = self._check_token()
         if not token:
             self.LOG.error("获取token失败")
-            return ""
+            return -1
 
-        def trigger_download_file(msg_id):
-            """触发下载文件"""
-            data = {"msg_svr_id": msg_id}
-            return self._make_request("trigger_download_file.html", data)
+        try:
+            headers = {
+                "content-type": "application/x-www-form-urlencoded; charset=utf-8",
+                "Authorization": f"Bearer {token}",
+            }
 
-        for _ in range(10):
-            res = trigger_download_file(msg_id)
-            try:
-                res_json = json.loads(res)
-                print(res_json)
-                if res_json.get("success"):
-                    sleep(3)
-                elif res_json.get("message") == "这条消息不是文件类型！":
-                    return ""
-                elif res_json.get("message") == "文件已下载":
-                    return res_json.get("url")
-            except (json.JSONDecodeError, TypeError):
-                self.LOG.error(f"解析响应失败: {res}")
+            response = await transport.apost(
+                self.base_url + endpoint,
+                headers=headers,
+                data=data,
+                params=params,
+            )
+            response.raise_for_status()
+            return response.content.decode("utf-8")
+        except httpx.HTTPError as e:
+            error_message = f"HTTP Request failed: {e}"
+            self.LOG.error(error_message)
+            return error_message
+
+    def _download_state(self, res):
+        """解析触发下载的响应
+        Returns:
+            tuple: (是否结束轮询, 文件链接)
+        """
+        try:
+            res_json = json.loads(res)
+        except (json.JSONDecodeError, TypeError):
+            self.LOG.error(f"解析响应失败: {res}")
+            return True, ""
+        if res_json.get("success"):
+            # 已触发下载，文件还没准备好
+            return False, ""
+        elif res_json.get("message") == "这条消息不是文件类型！":
+            return True, ""
+        elif res_json.get("message") == "文件已下载":
+            return True, res_json.get("url")
+        return False, ""
+
+    @staticmethod
+    def _download_delays(timeout=30, first=0.5, longest=8):
+        """轮询间隔：从 first 开始翻倍，最长 longest，总等待不超过 timeout"""
+        waited = 0
+        delay = first
+        while waited + delay <= timeout:
+            yield delay
+            waited += delay
+            delay = min(delay * 2, longest)
+
+    def down_file(self, msg_id, timeout=30) -> str:
+        """下载文件，返回文件链接（同步，按指数退避轮询）"""
+        data = {"msg_svr_id": msg_id}
+        delays = self._download_delays(timeout)
+        while True:
+            done, url = self._download_state(
+                self._make_request("trigger_download_file.html", data)
+            )
+            if done:
+                return url
+            delay = next(delays, None)
+            if delay is None:
+                self.LOG.error(f"等待文件下载超时: {msg_id}")
                 return ""
-        return ""
+            sleep(delay)
+
+    async def adown_file(self, msg_id, timeout=30) -> str:
+        """下载文件，返回文件链接（异步，等待时不占用线程）"""
+        data = {"msg_svr_id": msg_id}
+        delays = self._download_delays(timeout)
+        while True:
+            done, url = self._download_state(
+                await self._amake_request("trigger_download_file.html", data)
+            )
+            if done:
+                return url
+            delay = next(delays, None)
+            if delay is None:
+                self.LOG.error(f"等待文件下载超时: {msg_id}")
+                return ""
+            await asyncio.sleep(delay)
+
+    def _contact_page(self, content_type, page):
+        """获取一页联系人，返回 (联系人列表, 总页数)，失败返回 None"""
+        params = {
+            "page": page,
+            "type": content_type,
+        }
+        response = self._make_request("get_contact_info.html", {}, params)
+        try:
+            res_data = json.loads(response)
+            if not res_data.get("success"):
+                self.LOG.error(f"获取联系人信息失败: {res_data.get('message')}")
+                return None
+            data = res_data.get("data", {})
+            total_page = data.get("page", {}).get("total_page", 1)
+            return data.get("list", []), total_page
+        except (json.JSONDecodeError, TypeError, KeyError, AttributeError) as e:
+            self.LOG.error(f"解析联系人信息失败: {e}, 响应内容: {response}")
+            return None
+
+    def iter_contact_pages(self, content_type=0, workers=4):
+        """按页获取联系人
+        第一页返回总页数后，其余页最多 workers 个并发获取，按页码顺序返回
+        Args:
+            content_type (int): 0通讯录 1群聊
+            workers (int): 并发数
+        Yields:
+            tuple: (页码, 总页数, 该页联系人列表)，某页失败时停止，
+            调用方可以通过最后的页码是否等于总页数判断是否获取完整
+        """
+        first = self._contact_page(content_type, 1)
+        if first is None:
+            return
+        contacts, total_page = first
+        yield 1, total_page, contacts
+        if total_page <= 1:
+            return
+
+        pages = iter(range(2, total_page + 1))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="contacts"
+        ) as executor:
+            pending = deque()
+            try:
+                # 只提前提交 workers 页，调用方处理得慢时不会把所有页都堆在内存中
+                for page in islice(pages, workers):
+                    pending.append(
+                        (page, executor.submit(self._contact_page, content_type, page))
+                    )
+                while pending:
+                    page, future = pending.popleft()
+                    result = future.result()
+                    if result is None:
+                        return
+                    yield page, total_page, result[0]
+                    for page in islice(pages, 1):
+                        pending.append(
+                            (page, executor.submit(self._contact_page, content_type, page))
+                        )
+            finally:
+                for _, future in pending:
+                    future.cancel()
 
     def contact_info(self, content_type=0):
         """获取联系人信息
         Args:
             content_type (int): 0通讯录 1群聊
         Returns:
-            dict: 包含所有联系人信息的字典
+            list: 所有联系人（获取失败的页之后的联系人不包含在内）
         """
         all_contacts = []
-        current_page = 1
-        total_page = 1
-
-        # 循环获取所有页面的联系人信息
-        while current_page <= total_page:
-            params = {
-                "page": current_page,
-                "type": content_type,
-            }
-            response = self._make_request("get_contact_info.html", {}, params)
-
-            try:
-                # 解析响应数据
-                res_data = json.loads(response)
-                if not res_data.get("success"):
-                    self.LOG.error(f"获取联系人信息失败: {res_data.get('message')}")
-                    break
-
-                # 提取联系人列表并合并
-                contacts_list = res_data.get("data", {}).get("list", [])
-                all_contacts.extend(contacts_list)
-
-                # 更新总页数和当前页码
-                page_info = res_data.get("data", {}).get("page", {})
-                total_page = page_info.get("total_page", 1)
-                current_page += 1
-
-            except (json.JSONDecodeError, TypeError, KeyError) as e:
-                self.LOG.error(f"解析联系人信息失败: {e}, 响应内容: {response}")
-                break
-
-        # 返回包含所有联系人的结果
+        for _, _, contacts in self.iter_contact_pages(content_type):
+            all_contacts.extend(contacts)
         return all_contacts
 
-    def group_qr(self, roomid):
-        """获取群二维码"""
+    async def group_qr(self, roomid, timeout=30):
+        """获取群二维码
+        触发获取后等待带有同一 msg_id 的回调消息（main.root 收到时唤醒），不轮询数据库
+        Returns:
+            str: 二维码链接，失败或超时返回空字符串
+        """
         params = {"chat_room_id": roomid}
-        response = self._make_request("get_group_qr_code.html", params)
+        response = await self._amake_request("get_group_qr_code.html", params)
         try:
             # 解析响应数据
             response = json.loads(response)
             if response["success"] and response["message"] == "触发获取群二维码成功":
                 msg_id = response["data"]["data"]
-                from wxmsg import MessageDB
-
-                with MessageDB() as msgdb:
-                    for _ in range(10):
-                        sleep(3)
-                        msg = msgdb.select(msg_id)
-                        if msg:
-                            return msg[8]
-            else:
-                return ""
+                from wxmsg import message_waiters
+
+                msg = await message_waiters.wait(msg_id, timeout)
+                if msg:
+                    return str(msg.ext)
+                self.LOG.error(f"等待群二维码超时: {roomid}")
+            return ""
         except (json.JSONDecodeError, TypeError, KeyError) as e:
             self.LOG.error(f"解析群二维码失败: {e}, 响应内容: {response}")
             return ""
-    
+
     def group_manage(self, roomid, wxids, type=0):
         """
         群管理
@@ -251,6 +354,14 @@ class Client:
         return self._make_request("manage_group_members.html", data)
 
 
+def _part_file(dst_path):
+    """在目标目录创建临时文件，下载完成后再替换为目标文件"""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(dst_path)), suffix=".part"
+    )
+    return os.fdopen(fd, "wb"), tmp_path
+
+
 def down_file(msg_id, dst_path=""):
     """下载文件"""
     c = Client()
@@ -259,10 +370,41 @@ def down_file(msg_id, dst_path=""):
         return ""
     if not dst_path:
         return res
-    with open(dst_path, "wb") as f:
-        r = requests.get(res)
-        f.write(r.content)
+    f, tmp_path = _part_file(dst_path)
+    try:
+        with f, transport.client.stream("GET", res) as r:
+            r.raise_for_status()
+            for chunk in r.iter_bytes(CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(tmp_path, dst_path)
+        return dst_path
+    except (httpx.HTTPError, OSError) as e:
+        c.LOG.error(f"保存文件失败: {res} {e}")
+        os.unlink(tmp_path)
+        return ""
+
+
+async def adown_file(msg_id, dst_path=""):
+    """下载文件（异步），分块写入磁盘"""
+    c = Client()
+    res = await c.adown_file(msg_id)
+    if not res:
+        return ""
+    if not dst_path:
+        return res
+    f, tmp_path = _part_file(dst_path)
+    try:
+        with f:
+            async with transport.async_client.stream("GET", res) as r:
+                r.raise_for_status()
+                async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                    f.write(chunk)
+        os.replace(tmp_path, dst_path)
         return dst_path
+    except (httpx.HTTPError, OSError) as e:
+        c.LOG.error(f"保存文件失败: {res} {e}")
+        os.unlink(tmp_path)
+        return ""
 
 
 if __name__ == "__main__":
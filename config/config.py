@@ -2,43 +2,115 @@
 # @Time: 2024/09/23 11:31
 # @Author: Tech_T
 
-import yaml
+import copy
 import os
+import tempfile
+import threading
+
+import yaml
 
 
 class Config:
+    # 所有 Config 实例共用：配置文件路径 -> (mtime_ns, size, 解析结果)
+    _cache = {}
+    _lock = threading.Lock()
+
     def __init__(self):
         self.root_path = os.path.dirname(__file__)
         self.config_path = self.root_path + "/config.yaml"
 
-    def get_config(self, key, config_file: str = ""):
+    def _path(self, config_file: str = "") -> str:
         if config_file == "":
-            config_file = self.config_path
-        else:
-            config_file = os.path.join(self.root_path, config_file)
-        with open(config_file, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-        return config[key]
+            return self.config_path
+        return os.path.join(self.root_path, config_file)
+
+    def _load(self, config_file: str = "") -> dict:
+        """解析后的配置，文件修改（mtime/size 变化）后才重新解析"""
+        path = self._path(config_file)
+        stat = os.stat(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        with self._lock:
+            with open(path, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f)
+            self._cache[path] = (stat.st_mtime_ns, stat.st_size, config)
+        return config
+
+    @staticmethod
+    def _copy(value):
+        # 缓存的配置被所有调用方共享，容器类型返回副本
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+
+    def reload(self, config_file: str = ""):
+        """丢弃缓存，下次读取时重新解析"""
+        with self._lock:
+            self._cache.pop(self._path(config_file), None)
+
+    def get_config(self, key, config_file: str = ""):
+        return self._copy(self._load(config_file)[key])
 
     def get_config_all(self, config_file: str = ""):
-        if config_file == "":
-            config_file = self.config_path
-        else:
-            config_file = os.path.join(self.root_path, config_file)
-        with open(config_file, "r", encoding="utf-8") as f:
-            config_all = yaml.safe_load(f)
-        return config_all
+        return self._copy(self._load(config_file))
+
+    def get(self, key, default=None, config_file: str = ""):
+        """读取配置，不存在或为空时返回 default"""
+        value = (self._load(config_file) or {}).get(key)
+        return default if value is None else self._copy(value)
+
+    def get_str(self, key, default: str = "", config_file: str = "") -> str:
+        value = self.get(key, None, config_file)
+        return default if value is None else str(value)
+
+    def get_int(self, key, default: int = 0, config_file: str = "") -> int:
+        try:
+            return int(self.get(key, default, config_file))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default: float = 0.0, config_file: str = "") -> float:
+        try:
+            return float(self.get(key, default, config_file))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key, default: bool = False, config_file: str = "") -> bool:
+        value = self.get(key, default, config_file)
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+
+    def get_list(self, key, default=None, config_file: str = "") -> list:
+        value = self.get(key, None, config_file)
+        if value is None:
+            return list(default or [])
+        return value if isinstance(value, list) else [value]
+
+    def get_dict(self, key, default=None, config_file: str = "") -> dict:
+        value = self.get(key, None, config_file)
+        return value if isinstance(value, dict) else dict(default or {})
 
     def modify_config(self, key, value, config_file: str = ""):
         config_all = self.get_config_all(config_file)
         try:
             config_all[key] = value
-            if config_file == "":
-                config_file = self.config_path
-            else:
-                config_file = os.path.join(self.root_path, config_file)
-            with open(config_file, "w", encoding="utf-8") as f:
-                yaml.dump(config_all, f, allow_unicode=True)
-                return True
+            config_file = self._path(config_file)
+            # 先写临时文件再替换，读取方不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(config_file), suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    yaml.dump(config_all, f, allow_unicode=True)
+                os.chmod(tmp_path, os.stat(config_file).st_mode & 0o777)
+                os.replace(tmp_path, config_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            with self._lock:
+                self._cache.pop(config_file, None)
+            return True
         except:
             return False
@@ -0,0 +1,205 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+# 所有 databases/*.db 共用的连接参数
+PRAGMAS = (
+    ("journal_mode", "WAL"),  # 读写互不阻塞
+    ("synchronous", "NORMAL"),  # WAL 下只在 checkpoint 时 fsync
+    ("busy_timeout", 5000),  # 写锁等待 5s，而不是直接报 database is locked
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -16 * 1024),  # 16MB
+    ("temp_store", "MEMORY"),
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的连接（可被弱引用）"""
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池
+    每个线程、每个数据库文件复用同一个连接，连接创建时设置 PRAGMAS
+    """
+
+    def __init__(self, pragmas=PRAGMAS):
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+
+    def connect(self, db: str) -> sqlite3.Connection:
+        """获取当前线程 db 对应的连接"""
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        key = os.path.abspath(db)
+        conn = connections.get(key)
+        if conn is None:
+            conn = sqlite3.connect(
+                db, factory=PooledConnection, check_same_thread=False
+            )
+            for name, value in self.pragmas:
+                conn.execute(f"PRAGMA {name}={value}")
+            connections[key] = conn
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    @staticmethod
+    def release(conn: sqlite3.Connection, commit: bool = False):
+        """
+        归还连接：不关闭连接，只结束未完成的事务
+        commit=False 时回滚，与原来直接 close() 的效果一致
+        """
+        if conn is not None and conn.in_transaction:
+            if commit:
+                conn.commit()
+            else:
+                conn.rollback()
+
+    def close_all(self):
+        """关闭所有线程的连接（进程退出时调用）"""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                log.warning(f"关闭数据库连接失败: {e}")
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
+
+
+def connect(db: str) -> sqlite3.Connection:
+    return pool.connect(db)
+
+
+def release(conn: sqlite3.Connection, commit: bool = False):
+    pool.release(conn, commit)
+
+
+def close_all():
+    pool.close_all()
+
+
+# {db: {version: (描述, (sql, ...))}}
+_migrations = {}
+
+
+def register_migration(db: str, version: int, description: str, statements):
+    """
+    登记数据库迁移，由表所在的模块在导入时登记
+    :param db: 数据库文件，如 databases/messages.db
+    :param version: 迁移版本号，从 1 开始递增，执行后写入 PRAGMA user_version
+    :param description: 迁移说明
+    :param statements: 迁移执行的 SQL 语句
+    """
+    _migrations.setdefault(db, {})[version] = (description, tuple(statements))
+
+
+def migrate(db: str = None) -> bool:
+    """
+    执行尚未执行的迁移（启动时调用）
+    每个迁移在一个事务中执行，失败则回滚并停止该数据库后续的迁移，下次启动重试
+    :param db: 只迁移指定数据库，默认全部已登记的数据库
+    :return: 是否全部执行成功
+    """
+    success = True
+    for path in [db] if db else sorted(_migrations):
+        conn = None
+        try:
+            conn = connect(path)
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version in sorted(_migrations.get(path, {})):
+                if version <= current:
+                    continue
+                description, statements = _migrations[path][version]
+                conn.execute("BEGIN")
+                for sql in statements:
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version={int(version)}")
+                conn.commit()
+                log.info(f"{path} 迁移到版本 {version}: {description}")
+        except sqlite3.OperationalError as e:
+            success = False
+            if "no such table" in str(e):
+                log.warning(f"{path} 迁移跳过，表尚未创建: {e}")
+            else:
+                log.error(f"{path} 迁移失败: {e}")
+        finally:
+            release(conn)
+    return success
+
+
+def sync_rows(db: str, table: str, key: str, columns, rows, delete_missing=False) -> dict:
+    """
+    把远端数据同步到表中：按 key 比较每一行，只写入新增和有变化的行
+    需要 key 上有唯一索引（INSERT ... ON CONFLICT DO UPDATE）
+    不删除时只读取 rows 中的 key 对应的本地行，可以按页多次调用
+    :param columns: 除 key 外需要同步的列
+    :param rows: (key, *columns) 元组，key 重复时以后出现的为准
+    :param delete_missing: 删除远端没有的行，只有 rows 是完整数据时才能使用
+    :return: {"inserted", "updated", "deleted", "unchanged", "seconds"}
+    """
+    start = time.perf_counter()
+    columns = tuple(columns)
+    remote = {}
+    for row in rows:
+        remote[row[0]] = tuple(None if v is None else str(v) for v in row[1:])
+    column_list = ", ".join((key,) + columns)
+    upsert = (
+        f"INSERT INTO {table} ({column_list}) VALUES ({', '.join('?' * (len(columns) + 1))}) "
+        f"ON CONFLICT({key}) DO UPDATE SET "
+        + ", ".join(f"{c} = excluded.{c}" for c in columns)
+    )
+    conn = connect(db)
+    try:
+        # 读和写在同一个写事务中，比较的结果不会被其他写入改变
+        conn.execute("BEGIN IMMEDIATE")
+        select = f"SELECT {column_list} FROM {table}"
+        if delete_missing:
+            local = {row[0]: row[1:] for row in conn.execute(select)}
+        else:
+            local = {}
+            keys = list(remote)
+            # 每次最多 500 个参数，低于旧版本 SQLite 的 999 个参数限制
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                sql = f"{select} WHERE {key} IN ({', '.join('?' * len(chunk))})"
+                local.update((row[0], row[1:]) for row in conn.execute(sql, chunk))
+        inserted, updated = [], []
+        for k, values in remote.items():
+            old = local.get(k)
+            if old is None:
+                inserted.append((k,) + values)
+            elif old != values:
+                updated.append((k,) + values)
+        deleted = [(k,) for k in local if k not in remote] if delete_missing else []
+        if inserted or updated:
+            conn.executemany(upsert, inserted + updated)
+        if deleted:
+            conn.executemany(f"DELETE FROM {table} WHERE {key} = ?", deleted)
+        conn.commit()
+    finally:
+        release(conn)
+    return {
+        "inserted": len(inserted),
+        "updated": len(updated),
+        "deleted": len(deleted),
+        "unchanged": len(remote) - len(inserted) - len(updated),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,209 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import asyncio
+import time
+from collections import deque
+
+import httpx
+
+from config.config import Config
+from config.log import LogConfig
+from transport import transport
+
+log = LogConfig().get_logger()
+
+
+class CircuitBreaker:
+    """
+    转发目标的熔断器
+    连续失败 failure_threshold 次后断开，reset_timeout 秒内不再请求该目标；
+    之后放行一次试探请求，成功则恢复，失败则继续断开
+    """
+
+    __slots__ = ("failure_threshold", "reset_timeout", "failures", "opened_at", "trial")
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def on_success(self):
+        self.failures = 0
+        self.trial = False
+
+    def on_failure(self):
+        self.failures += 1
+        self.trial = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class Forwarder:
+    """
+    后台转发收到的消息到 forward_url
+    webhook 只把原始请求体放入内存缓冲区，由 workers 个后台任务转发，不等待转发结果
+    缓冲区满时按 overflow 丢弃：drop_oldest 丢弃最早的，drop_newest 丢弃新消息
+    mode：failover 依次尝试，直到一个目标成功（原来的行为）；fanout 同时发给所有目标
+    """
+
+    def __init__(
+        self,
+        mode="failover",
+        max_buffer=1000,
+        overflow="drop_oldest",
+        workers=4,
+        timeout=5,
+        failure_threshold=5,
+        reset_timeout=30,
+    ):
+        """
+        :param mode: failover 或 fanout
+        :param max_buffer: 缓冲区最多保存的消息数
+        :param overflow: drop_oldest 或 drop_newest
+        :param workers: 同时转发的消息数
+        :param timeout: 每个目标的请求超时（秒）
+        :param failure_threshold: 熔断前的连续失败次数
+        :param reset_timeout: 熔断持续时间（秒）
+        """
+        self.mode = mode
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.workers = workers
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._buffer = deque()
+        self._ready = None
+        self._tasks = []
+        self._breakers = {}
+        self.forwarded = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_config(cls):
+        """使用 config.yaml 中的 forward 配置"""
+        options = Config().get_dict("forward")
+        return cls(**options)
+
+    def start(self):
+        """在事件循环中启动后台转发任务"""
+        self._ready = asyncio.Event()
+        if self._buffer:
+            self._ready.set()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止后台任务，缓冲区中未转发的消息丢弃"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._buffer:
+            log.warning(f"转发已停止，丢弃{len(self._buffer)}条未转发的消息")
+            self.dropped += len(self._buffer)
+            self._buffer.clear()
+
+    def put(self, payload: bytes):
+        """放入转发缓冲区，立即返回"""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return
+            self._buffer.popleft()
+        self._buffer.append(payload)
+        if self._ready is not None:
+            self._ready.set()
+
+    def _breaker(self, url) -> CircuitBreaker:
+        breaker = self._breakers.get(url)
+        if breaker is None:
+            breaker = self._breakers[url] = CircuitBreaker(
+                self.failure_threshold, self.reset_timeout
+            )
+        return breaker
+
+    async def _post(self, url, payload) -> bool:
+        breaker = self._breaker(url)
+        if not breaker.allow():
+            return False
+        try:
+            response = await transport.async_client.post(
+                url,
+                content=payload,
+                headers={"User-Agent": "tech_t", "Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            ok = response.status_code < 400
+        except httpx.HTTPError as e:
+            log.warning(f"转发失败: {url} {e!r}")
+            ok = False
+        if ok:
+            breaker.on_success()
+        else:
+            breaker.on_failure()
+            if breaker.state == "open":
+                log.warning(f"转发目标连续失败{breaker.failures}次，暂停{self.reset_timeout}秒: {url}")
+        return ok
+
+    async def deliver(self, payload: bytes) -> bool:
+        """转发一条消息，返回是否至少一个目标成功"""
+        urls = Config().get_list("forward_url")
+        if self.mode == "fanout":
+            results = await asyncio.gather(*[self._post(url, payload) for url in urls])
+            ok = any(results)
+        else:
+            ok = False
+            for url in urls:
+                if await self._post(url, payload):
+                    ok = True
+                    break
+        if ok:
+            self.forwarded += 1
+        elif urls:
+            self.failed += 1
+        return ok
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            payload = self._buffer.popleft()
+            try:
+                await self.deliver(payload)
+            except Exception as e:
+                log.error(f"转发消息出错: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "forwarded": self.forwarded,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "breakers": {url: b.state for url, b in self._breakers.items()},
+        }
+
+
+forwarder = Forwarder.from_config()
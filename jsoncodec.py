@@ -0,0 +1,49 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+"""
+JSON 编解码
+安装了 orjson 时使用 orjson，否则使用标准库 json，两者的输出都可以互相解析
+解析失败统一抛出 json.JSONDecodeError（orjson.JSONDecodeError 是它的子类）
+注意 orjson 把超出 64 位的整数解析为 float
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安装 orjson 时使用标准库
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data):
+    """解析 bytes 或 str"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson 更严格（NaN、非法的 UTF-8 等），交给标准库再试一次
+            pass
+    return json.loads(data)
+
+
+def dumpb(obj) -> bytes:
+    """序列化为 UTF-8 编码的 bytes（HTTP 请求体）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson 不支持的类型（如非字符串的键、超出 64 位的整数）交给标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj) -> str:
+    """序列化为 str（写入数据库），中文不转义"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
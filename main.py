@@ -9,41 +9,59 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 import models
-import re
 import os
-from wxmsg import WxMsg, MessageDB
+from wxmsg import WxMsg, message_waiters, message_writer
 from config.log import LogConfig
 from config.config import Config
-from models.manage.member import Member
+import database
+import jsoncodec
+from ratelimit import SendRateLimiter
+from transport import transport
+from forwarder import forwarder
+from rules import rule_engine
 import asyncio
 from contextlib import asynccontextmanager
-import random
-from sendqueue import QueueDB, send_text
+from sendqueue import QueueConsumer, send_text
 from models.task import task_start
 from models.manage.manage import forward_msg
+from models.manage.member import contacts_directory, chatroom_directory
 from models.lesson import datas_api
 
 log = LogConfig().get_logger()
 config = Config()
 timer_random = config.get_config("queue_timer_random")
+rule_engine.set_mode(config.get_str("rule_match_mode", "sequential"))
+
+
+queue_consumer = QueueConsumer(
+    workers=config.get("queue_workers"),
+    batch_size=config.get("queue_batch_size"),
+    pacing=timer_random,
+    limiter=SendRateLimiter.from_config(),
+    weights=config.get("queue_lane_weights"),
+    lease=config.get("queue_lease"),
+    max_attempts=config.get("queue_max_attempts"),
+    retry_backoff=config.get("queue_retry_backoff"),
+)
 
 
 async def consume_queue():
-    while True:
-        with QueueDB() as q:
-            q.__consume__()
-        await asyncio.sleep(
-            random.randint(*timer_random)
-        )  # 修改这里：使用timer_random而不是time_random
+    await queue_consumer.run()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 启动时启动队列消费任务
+    database.migrate()
+    # 启动时启动消息写入和队列消费任务
+    message_writer.start(
+        batch_size=config.get("message_batch_size"),
+        flush_ms=config.get("message_flush_ms"),
+    )
     tasks = [
         asyncio.create_task(task_start()),  # 删除多余的逗号
         asyncio.create_task(consume_queue()),
     ]
+    forwarder.start()
 
     try:
         yield
@@ -52,6 +70,10 @@ async def lifespan(app: FastAPI):
         for task in tasks:
             task.cancel()
         await asyncio.gather(*tasks, return_exceptions=True)
+        await forwarder.stop()
+        await message_writer.stop()
+        await transport.aclose()
+        database.close_all()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -77,7 +99,14 @@ app.include_router(datas_api.router, prefix="/api")
 # 添加健康检查端点
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "message_writer": message_writer.stats(),
+        "queue_consumer": queue_consumer.stats(),
+        "forwarder": forwarder.stats(),
+        "contacts": contacts_directory.stats(),
+        "chatroom": chatroom_directory.stats(),
+    }
 
 
 # 配置静态文件目录
@@ -89,20 +118,22 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 @app.post("/")
 async def root(request: Request):
-    body = await request.json()
+    # 请求体只解析一次，转发时直接使用原始字节
+    raw = await request.body()
+    body = jsoncodec.loads(raw)
     print(body)
     msg = WxMsg(body)
-    with MessageDB() as db:
-        db.insert(msg.__to_dict__())
+    message_writer.put(msg.__to_dict__())
+    message_waiters.resolve(msg)
     log.info(msg.__str__())
 
     if not msg.is_self:
-        await forward_msg(body)
+        await forward_msg(raw)
         reply, func, msg = trigger(msg)
         if reply:
             if len(msg.content) < 50:
                 aters = msg.sender if msg.is_group else ""
-                send_text(reply, msg.roomid, aters)
+                send_text(reply, msg.roomid, aters, priority="interactive")
 
         if func:
             trigger_func = getattr(models, func)
@@ -119,46 +150,9 @@ def trigger(msg):
     # TODO: 1. 触发事件 注意 对特定标签的 member 进行AI_content 生成
     # TODO: 2. 违禁词检测
 
-    with Member() as m:
-        rules = m.permission_info()
-        if rules:
-            for rule in rules:
-                acitvate = rule[3]  # 是否禁用
-                if acitvate == 0:
-                    continue
-                msg_type = rule[6] if rule[6] else "all"
-                pattern = rule[7] if rule[7] else ""
-                keywords = rule[8].split("/") if rule[8] else []
-                reply = rule[11] if rule[11] else ""
-                row = {
-                    "func": rule[1] if rule[1] else "",
-                    "blacklist": rule[4].split("/") if rule[4] else [],
-                    "whitelist": rule[5].split("/") if rule[5] else [],
-                    "type": msg_type,
-                    "pattern": pattern,
-                    "keywords": keywords,
-                    "ai_flag": rule[9],
-                    "need_at": rule[10] if rule[10] else 0,
-                    "reply": reply,
-                }
-                if msg_type != "all" and str(msg_type) != str(msg.type):
-                    continue
-                if row["need_at"] and not msg.is_at:
-                    continue
-                if msg.roomid in row["blacklist"]:
-                    continue
-                if row["whitelist"] != ["all"] and msg.roomid not in row["whitelist"]:
-                    continue
-                if row["ai_flag"]:
-                    msg.content = ai_content(msg.content, row["keywords"])
-                if row["whitelist"] != ["all"] and msg.roomid in row["whitelist"]:
-                    if not re.search(row["pattern"], msg.content, re.DOTALL):
-                        continue
-                    return row["reply"], row["func"], msg
-                if row["whitelist"] == ["all"]:
-                    if not re.search(row["pattern"], msg.content, re.DOTALL):
-                        continue
-                    return row["reply"], row["func"], msg
+    rule = rule_engine.match(msg, ai_content)
+    if rule:
+        return rule.reply, rule.func, msg
     return None, None, msg
 
 
@@ -99,7 +99,6 @@ def gk_countdown():
     msg = msg + "\n" + gk_tips + "\n" + zk_tips
     for r in Config().get_config("gk_remind"):
         send_text(msg, r)
-        time.sleep(1)
 
 
 def ju_pai(words):
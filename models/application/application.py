@@ -5,6 +5,7 @@
 import os
 import sqlite3
 import time
+import database
 from datetime import datetime
 import pandas as pd
 from config.log import LogConfig
@@ -36,13 +37,12 @@ class Application:
         self.db_path = db_path
 
     def __enter__(self):
-        self.__conn__ = sqlite3.connect(self.db_path)
+        self.__conn__ = database.connect(self.db_path)
         self.__cursor__ = self.__conn__.cursor()
         return self
 
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
-        if self.__conn__:
-            self.__conn__.close()
+        database.release(self.__conn__)
 
     def query_zy(self, zymc="", zydm=0):
         """
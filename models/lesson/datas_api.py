@@ -9,6 +9,7 @@ import os
 from requests import get
 
 from models.lesson.lesson import Lesson
+from models.lesson.workbook import workbook_cache
 from models.lesson.homework import Homework
 
 router = APIRouter()
@@ -24,37 +25,50 @@ def get_schedule_data(next_week: bool = False):
     }
     l = Lesson()
     class_template = l.class_template
-    # print(class_template)
-    schedule_file = l.current_schedule_file(next_week)
-    # print(schedule_file)
-    df_schedule_original = pd.read_excel(schedule_file, engine="openpyxl")
-    df_schedule = l.format_schedule(df_schedule_original, week_next=next_week)
+    class_codes = dict(zip(class_template["class_name"], class_template["class_code"]))
+    index = l.schedule_index(next_week)
     schedule_data = {}
-    for class_name in df_schedule.columns[4:]:
-        if class_name not in class_template["class_name"].tolist():
+    if index is None:
+        return schedule_data
+    for class_name in index.classes:
+        if class_name not in class_codes:
             continue
-        class_code = str(
-            class_template[class_template["class_name"] == class_name][
-                "class_code"
-            ].values[0]
-        )
-        schedule_data[class_code] = {}
-        for week, group in df_schedule[[class_name, "week"]].groupby("week"):
-            schedule_data[class_code][weekdays[str(week)]] = group[class_name].tolist()
+        schedule_data[str(class_codes[class_name])] = {
+            weekdays[str(week)]: subjects
+            for week, subjects in index.class_days(class_name).items()
+        }
     return schedule_data
 
 
+def get_teacher_schedule_data(teacher_name: str, next_week: bool = False):
+    """教师的课表 {星期(1-5): {节次: [{class_code, subject}, ...]}}"""
+    l = Lesson()
+    class_template = l.class_template
+    class_codes = dict(zip(class_template["class_name"], class_template["class_code"]))
+    teacher_schedule = {str(i): {} for i in range(1, 6)}  # 周一到周五
+    index = l.schedule_index(next_week)
+    if index is None:
+        return teacher_schedule
+
+    period_names = list(PERIODS.keys())
+    for entry in index.subject_entries(TEACHERS_DATA[teacher_name]):
+        day_number = str(entry.week)
+        if entry.class_name not in class_codes or day_number not in teacher_schedule:
+            continue
+        period = period_names[entry.period]
+        teacher_schedule[day_number].setdefault(period, []).append(
+            {"class_code": str(class_codes[entry.class_name]), "subject": entry.subject}
+        )
+    return teacher_schedule
+
+
 SCHEDULE_DATA = get_schedule_data()
 CLASS_LIST = list(SCHEDULE_DATA.keys())
 
 
 def get_teacher_data():
     l = Lesson()
-    subject_teacher = pd.read_excel(
-        os.path.join(l.lesson_dir, "checkTemplate.xlsx"),
-        sheet_name="teachers",
-        engine="openpyxl",
-    )
+    subject_teacher = l.teacher_template
     teachers_data = {}
     for teacher in subject_teacher["name"].tolist():
         teachers_data[teacher] = (
@@ -108,11 +122,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30000
 
 def get_user_data():
     l = Lesson()
-    subject_teacher = pd.read_excel(
-        os.path.join(l.lesson_dir, "checkTemplate.xlsx"),
-        sheet_name="teachers",
-        engine="openpyxl",
-    )
+    subject_teacher = l.teacher_template
     users_data = {}
     for teacher in subject_teacher["name"].tolist():
         users_data[teacher] = {}
@@ -319,7 +329,9 @@ async def get_students(class_code: str):
     """获取指定班级的学生名单"""
     l = Lesson()
     student_template_file = os.path.join(l.lesson_dir, "students.xlsx")
-    student_template = pd.read_excel(student_template_file, sheet_name=str(class_code))
+    student_template = workbook_cache.read(
+        student_template_file, sheet_name=str(class_code)
+    )
     students = student_template["name"].to_list()
     return {"students": students}
 
@@ -397,32 +409,7 @@ async def get_teacher_schedule(teacher_name: str):
     if teacher_name not in TEACHERS_DATA:
         raise HTTPException(status_code=404, detail="教师不存在")
 
-    teacher_subjects = TEACHERS_DATA[teacher_name]
-    teacher_schedule = {str(i): {} for i in range(1, 6)}  # 周一到周五
-    weekday_map = {
-        "monday": "1",
-        "tuesday": "2",
-        "wednesday": "3",
-        "thursday": "4",
-        "friday": "5",
-    }
-
-    schedule_data = get_schedule_data()
-
-    for class_code, schedule in schedule_data.items():
-        for day_name, day_schedule in schedule.items():
-            day_number = weekday_map.get(day_name)
-            if day_number:
-                for period_index, subject in enumerate(day_schedule):
-                    if subject in teacher_subjects:
-                        period = list(PERIODS.keys())[period_index]
-                        if period not in teacher_schedule[day_number]:
-                            teacher_schedule[day_number][period] = []
-                        teacher_schedule[day_number][period].append(
-                            {"class_code": class_code, "subject": subject}
-                        )
-
-    return {"schedule": teacher_schedule}
+    return {"schedule": get_teacher_schedule_data(teacher_name)}
 
 
 @router.get(
@@ -434,32 +421,7 @@ async def get_teacher_schedule_nextweek(teacher_name: str):
     if teacher_name not in TEACHERS_DATA:
         raise HTTPException(status_code=404, detail="教师不存在")
 
-    teacher_subjects = TEACHERS_DATA[teacher_name]
-    teacher_schedule = {str(i): {} for i in range(1, 6)}  # 周一到周五
-    weekday_map = {
-        "monday": "1",
-        "tuesday": "2",
-        "wednesday": "3",
-        "thursday": "4",
-        "friday": "5",
-    }
-
-    schedule_data = get_schedule_data(next_week=True)
-
-    for class_code, schedule in schedule_data.items():
-        for day_name, day_schedule in schedule.items():
-            day_number = weekday_map.get(day_name)
-            if day_number:
-                for period_index, subject in enumerate(day_schedule):
-                    if subject in teacher_subjects:
-                        period = list(PERIODS.keys())[period_index]
-                        if period not in teacher_schedule[day_number]:
-                            teacher_schedule[day_number][period] = []
-                        teacher_schedule[day_number][period].append(
-                            {"class_code": class_code, "subject": subject}
-                        )
-
-    return {"schedule": teacher_schedule}
+    return {"schedule": get_teacher_schedule_data(teacher_name, next_week=True)}
 
 
 @router.get("/teachers", dependencies=[Depends(get_current_user)])
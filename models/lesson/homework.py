@@ -4,6 +4,7 @@
 
 import sqlite3
 import time
+import database
 import re
 from datetime import datetime
 from sendqueue import send_text
@@ -12,6 +13,16 @@ from models.manage.member import check_permission
 
 log = LogConfig().get_logger()
 
+database.register_migration(
+    "databases/homework.db",
+    1,
+    "作业查询索引",
+    [
+        # get_homework: WHERE class_code, subject, type ORDER BY id DESC LIMIT 1
+        "CREATE INDEX IF NOT EXISTS idx_homework_lookup ON homework(class_code, subject, type, id)"
+    ],
+)
+
 
 class Homework:
     def __init__(self):
@@ -32,12 +43,12 @@ class Homework:
 
     def __enter__(self, db_path="databases/homework.db"):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = database.connect(self.db_path)
         self.cursor = self.conn.cursor()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.conn.close()
+        database.release(self.conn)
 
     def __create_table__(self):
         try:
@@ -8,17 +8,19 @@ import re
 import shutil
 import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from html2image import Html2Image
 
 import pandas as pd
 import requests
-from functools import lru_cache
 from config.config import Config
 from config.log import LogConfig
 from sendqueue import send_text, send_image, send_file, send_app_msg
-from client import down_file
+from client import down_file, adown_file
 from models.manage.member import Member, check_permission
+from models.lesson.schedule_index import ScheduleIndex, subject_maps
+from models.lesson.workbook import template_bundle, workbook_cache
 
 log = LogConfig().get_logger()
 
@@ -55,6 +57,7 @@ def error_handler(func):
 class Lesson:
     _instance = None  # 单例实例
     _hti_lock = threading.Lock()  # 类级别的锁
+    SCHEDULE_CACHE_SIZE = 16  # 缓存的格式化课表和课表索引数量
 
     def __new__(cls):
         if cls._instance is None:
@@ -94,6 +97,8 @@ class Lesson:
         self._ip_info_cache = None
         self._contacts_cache = None
         self._time_table_cache = None
+        self._schedule_cache = OrderedDict()
+        self._schedule_lock = threading.Lock()
 
         # 创建一个全局的Html2Image实例
         self.hti = Html2Image()
@@ -137,15 +142,9 @@ class Lesson:
         if cache_type in self._cache_config:
             self._cache_config[cache_type]["last_update"] = time.time()
 
-    @lru_cache(maxsize=None)
     def _read_excel_with_cache(self, file_path, sheet_name=0, **kwargs):
-        """使用 lru_cache + 文件修改时间感知的缓存"""
-        file_mtime = os.path.getmtime(file_path)
-        kwargs_str = str(sorted(kwargs.items()))  # 确保 kwargs 可哈希
-        cache_key = (file_path, file_mtime, sheet_name, kwargs_str)
-        return pd.read_excel(
-            file_path, sheet_name=sheet_name, engine="openpyxl", **kwargs
-        )
+        """读取 Excel，按文件修改时间和大小缓存，返回副本"""
+        return workbook_cache.read(file_path, sheet_name=sheet_name, **kwargs)
 
     @error_handler
     def _load_excel_file(
@@ -165,36 +164,46 @@ class Lesson:
         except Exception as e:
             raise LessonError(f"{error_msg}: {str(e)}")
 
+    @property
+    def template_path(self):
+        return os.path.join(self.lesson_dir, "checkTemplate.xlsx")
+
+    def template_sheet(self, sheet_name):
+        """checkTemplate.xlsx 中的一个 sheet（所有 sheet 一次读取并共享，返回副本）"""
+        return template_bundle(self.template_path).sheet(sheet_name)
+
+    @error_handler
+    def _load_template_sheet(self, sheet_name, error_msg="读取课程模板文件失败"):
+        """加载 checkTemplate.xlsx 中的 sheet，失败时通知管理员"""
+        if not os.path.exists(self.template_path):
+            raise FileNotFoundError(f"文件不存在: {self.template_path}")
+
+        try:
+            return self.template_sheet(sheet_name)
+        except Exception as e:
+            raise LessonError(f"{error_msg}: {str(e)}")
+
     @property
     def teacher_template(self):
         """加载教师模板数据"""
-        template_path = os.path.join(self.lesson_dir, "checkTemplate.xlsx")
         try:
-            return self._load_excel_file(
-                template_path, "teachers", error_msg="读取课程模板文件失败"
-            )
+            return self._load_template_sheet("teachers", error_msg="读取课程模板文件失败")
         except LessonError:
             return pd.DataFrame()
 
     @property
     def class_template(self):
         """加载班级模板数据"""
-        template_path = os.path.join(self.lesson_dir, "checkTemplate.xlsx")
         try:
-            return self._load_excel_file(
-                template_path, "class", error_msg="读取课程模板文件失败"
-            )
+            return self._load_template_sheet("class", error_msg="读取课程模板文件失败")
         except LessonError:
             return pd.DataFrame()
 
     @property
     def time_table(self):
         """加载时间表数据"""
-        template_path = os.path.join(self.lesson_dir, "checkTemplate.xlsx")
         try:
-            return self._load_excel_file(
-                template_path, "class_time", error_msg="读取时间表文件失败"
-            )
+            return self._load_template_sheet("class_time", error_msg="读取时间表文件失败")
         except LessonError:
             return pd.DataFrame()
 
@@ -424,11 +433,18 @@ class Lesson:
             log.info(f"临时文件夹不存在: {temp_dir}")
             self.notify_admins(f"临时文件夹不存在: {temp_dir}")
 
-    def _get_schedule_data(self, week_next=False):
-        """获取课表数据的通用方法"""
+    def _schedule_file(self, week_next=False):
+        """当前(下周)课表文件路径，不存在时返回None"""
         schedule_file = self.current_schedule_file(week_next=week_next)
         if not schedule_file or not os.path.exists(schedule_file):
             return None
+        return schedule_file
+
+    def _get_schedule_data(self, week_next=False):
+        """获取课表数据的通用方法"""
+        schedule_file = self._schedule_file(week_next)
+        if schedule_file is None:
+            return None
 
         try:
             return self._read_excel_with_cache(schedule_file)
@@ -501,83 +517,172 @@ class Lesson:
         )
         return self._current_schedule_file
 
+    def _week_flag(self, week_next: bool = False) -> str:
+        """实际上课的单双周标记（单/双）"""
+        current_week = self.week_info[0]
+        return (
+            "单"
+            if (not week_next and current_week % 2 == 1)
+            or (week_next and current_week % 2 == 0)
+            else "双"
+        )
+
+    @staticmethod
+    def _schedule_rules(bundle, ignore: bool = False):
+        """由模板生成格式化规则：(替换表, 忽略的科目)"""
+        replace_template = bundle.sheet("replace")
+        replace_dict = {
+            str(old): "" if pd.isna(new) else str(new)
+            for old, new in zip(replace_template["string"], replace_template["replace"])
+            if not pd.isna(old) and str(old)
+        }
+        ignore_subject = bundle.sheet("ignore")["subject"].tolist() if ignore else []
+        return replace_dict, ignore_subject
+
+    def _clean_text(self, texts: pd.Series, replace_dict) -> pd.Series:
+        """去空白、替换标点"""
+        texts = texts.str.replace(self._regex_patterns["clean_string"], "", regex=True)
+        # 按模板顺序逐条替换：前一条的结果可能被后一条再次替换（如 （ -> ( -> [）
+        for old, new in replace_dict.items():
+            texts = texts.str.replace(old, new, regex=False)
+        return texts.str.strip()
+
+    @staticmethod
+    def _week_text(texts: pd.Series, week_tag: str) -> pd.Series:
+        """形如 "语文(单)/数学(双)" 的单元格只保留本周上课的科目"""
+        pairs = texts[texts.str.count("/") == 1]
+        if pairs.empty:
+            return texts
+        parts = pairs.str.split("/", expand=True)
+        first, second = parts[0], parts[1]
+        chosen = first.where(
+            first.str.contains(week_tag, regex=False),
+            second.where(second.str.contains(week_tag, regex=False)),
+        ).dropna()
+        if chosen.empty:
+            return texts
+        texts = texts.copy()
+        texts.loc[chosen.index] = chosen.str.replace(week_tag, "", regex=False).str.strip()
+        return texts
+
+    def _normalize_schedule(
+        self, df_schedule: pd.DataFrame, week_flag: str, bundle, ignore: bool = False
+    ) -> pd.DataFrame:
+        """
+        格式化课表的实现
+        课表中重复的单元格很多，只对不重复的字符串用 pandas 字符串方法整体处理一次，再映射回课表
+        """
+        replace_dict, ignore_subject = self._schedule_rules(
+            bundle, ignore
+        )
+        # 替换NaN值为'-'
+        df_schedule = df_schedule.fillna("-")
+        text_columns = [
+            col
+            for col, dtype in df_schedule.dtypes.items()
+            if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+        ]
+        if not text_columns:
+            return df_schedule
+        cells = pd.Series(df_schedule[text_columns].to_numpy(dtype=object).ravel())
+        texts = pd.Series([v for v in cells.unique() if isinstance(v, str)], dtype=object)
+        if texts.empty:
+            return df_schedule
+
+        normalized = self._clean_text(texts, replace_dict)
+        # 处理需要忽略的科目
+        if ignore_subject:
+            normalized = normalized.mask(normalized.isin(ignore_subject), "-")
+        # 处理单双周
+        normalized = self._week_text(normalized, f"({week_flag})")
+
+        mapped = cells.map(dict(zip(texts, normalized)))
+        mapped = mapped.where(mapped.notna(), cells).to_numpy()
+        df_schedule[text_columns] = mapped.reshape(len(df_schedule), len(text_columns))
+        return df_schedule
+
     def format_schedule(
-        self, df_schedule: pd.DataFrame, week_next: bool = False, ignore: bool = False
+        self, df_schedule, week_next: bool = False, ignore: bool = False
     ) -> pd.DataFrame:
         """
         格式化课表, 将课表中的标点符号统一化，并根据单双周进行调整（选择实际上课的科目）
 
         Args:
-            df_schedule: 课表DataFrame
+            df_schedule: 课表DataFrame，或课表文件路径
+                传入路径时按 (文件, 单双周, ignore) 缓存格式化结果，文件或模板修改后重新格式化
             week_next: 是否是下周课表
             ignore: 是否忽略特定科目
 
         Returns:
             pd.DataFrame: 格式化后的课表
         """
-        # 替换NaN值为'-'
-        df_schedule = df_schedule.fillna("-")
-
-        # 读取替换模板
-        replace_template = self._read_excel_with_cache(
-            os.path.join(self.lesson_dir, "checkTemplate.xlsx"), sheet_name="replace"
+        week_flag = self._week_flag(week_next)
+        bundle = template_bundle(self.template_path)
+        if not isinstance(df_schedule, str):
+            return self._normalize_schedule(df_schedule, week_flag, bundle, ignore)
+
+        df = self._schedule_memo(
+            "format",
+            df_schedule,
+            week_flag,
+            ignore,
+            bundle,
+            lambda path: self._normalize_schedule(
+                self._read_excel_with_cache(path), week_flag, bundle, ignore
+            ),
         )
-        replace_dict = dict(
-            zip(replace_template["string"], replace_template["replace"])
+        return df.copy()
+
+    def _schedule_memo(self, kind, schedule_file, week_flag, ignore, bundle, build):
+        """按 (文件, 单双周, ignore, 模板版本) 缓存由课表文件生成的结果"""
+        path = os.path.abspath(schedule_file)
+        stat = os.stat(path)
+        key = (
+            kind,
+            path,
+            stat.st_mtime_ns,
+            stat.st_size,
+            week_flag,
+            ignore,
+            bundle.mtime_ns,
+            bundle.size,
+        )
+        with self._schedule_lock:
+            cached = self._schedule_cache.get(key)
+            if cached is not None:
+                self._schedule_cache.move_to_end(key)
+                return cached
+
+        result = build(path)
+        with self._schedule_lock:
+            self._schedule_cache[key] = result
+            while len(self._schedule_cache) > self.SCHEDULE_CACHE_SIZE:
+                self._schedule_cache.popitem(last=False)
+        return result
+
+    def schedule_index(
+        self, week_next: bool = False, ignore: bool = False, schedule_file: str = None
+    ) -> ScheduleIndex:
+        """
+        课表的索引，课表文件或模板修改后重新构建，课表不存在时返回None
+        schedule_file 为空时使用当前(下周)课表
+        """
+        if schedule_file is None:
+            schedule_file = self._schedule_file(week_next)
+            if schedule_file is None:
+                return None
+        week_flag = self._week_flag(week_next)
+        bundle = template_bundle(self.template_path)
+        return self._schedule_memo(
+            "index",
+            schedule_file,
+            week_flag,
+            ignore,
+            bundle,
+            lambda path: ScheduleIndex(
+                self.format_schedule(path, week_next, ignore), bundle.sheet("teachers")
+            ),
         )
-        # 定义字符串处理函数
-
-        def clean_string(x):
-            if not isinstance(x, str):
-                return x
-            # 链式调用string方法
-            result = str(x).strip()
-            # 使用预编译的正则表达式一次性替换所有空白字符
-            result = self._regex_patterns["clean_string"].sub("", result)
-            # 批量替换标点符号
-            for old, new in replace_dict.items():
-                if old in result:
-                    result = result.replace(old, new)
-            return result.strip()
-
-        # 使用apply函数进行数据转换
-        df_schedule = df_schedule.map(clean_string)
-
-        # 处理需要忽略的科目
-        if ignore:
-            ignore_subject = self._read_excel_with_cache(
-                os.path.join(self.lesson_dir, "checkTemplate.xlsx"), sheet_name="ignore"
-            )["subject"].tolist()
-
-            def ignore_subjects(x):
-                return "-" if x in ignore_subject else x
-
-            df_schedule = df_schedule.map(ignore_subjects)
-
-        # 处理单双周
-        def process_week_schedule(x):
-            if not isinstance(x, str):
-                return x
-
-            current_week = self.week_info[0]
-            week_flag = (
-                "单"
-                if (not week_next and current_week % 2 == 1)
-                or (week_next and current_week % 2 == 0)
-                else "双"
-            )
-
-            subjects = x.split("/")
-            if len(subjects) == 2:
-                for subject in subjects:
-                    if f"({week_flag})" in subject:
-                        return subject.replace(f"({week_flag})", "").strip()
-            return x
-
-        # 使用apply函数处理单双周
-        df_schedule = df_schedule.map(process_week_schedule)
-
-        return df_schedule
 
     def get_subject_teacher(self, subject: str) -> str:
         """获取科目对应的老师"""
@@ -598,7 +703,7 @@ class Lesson:
         将课表中的科目替换为对应的老师
 
         Args:
-            df_schedule: 课表DataFrame
+            df_schedule: 课表DataFrame，或课表文件路径（使用缓存的格式化结果）
             teacher_flag: 是否替换为老师名字
             week_next: 是否是下周课表
             ignore: 是否忽略特定科目
@@ -612,17 +717,9 @@ class Lesson:
         if self.class_template is None:
             return df_schedule
 
-        # 读取科目-老师对应关系
-        subject_teacher = self.teacher_template
-
-        # 创建科目到老师的映射字典
-        subject_to_teacher = {}
-        for _, row in subject_teacher.iterrows():
-            for subj in row["subject"].split("/"):
-                if teacher_flag:
-                    subject_to_teacher[subj.strip()] = row["name"]
-                else:
-                    subject_to_teacher[subj.strip()] = subj[:2]
+        # 科目到老师（简称）的对应关系，与 ScheduleIndex 相同
+        subject_teacher, subject_short = subject_maps(self.teacher_template)
+        subject_to_teacher = subject_teacher if teacher_flag else subject_short
 
         # 定义替换函数
         def replace_with_teacher(x):
@@ -807,29 +904,20 @@ class Lesson:
 
         return "ok"
 
-    def _check_repeated_subjects(self, df: pd.DataFrame, ignore: bool = False) -> str:
-        """检查课表中是否有重复的科目"""
-        df_teacher = self.repalce_subject_teacher(df, ignore=ignore)
-        df_subject = self.format_schedule(df, ignore=ignore)
+    def _check_repeated_subjects(self, schedule_file: str, ignore: bool = False) -> str:
+        """检查课表中是否有重复的科目（同一位老师同一节课在多个班级上课）"""
         if self.class_template is None:
             return "class_template Error"
         class_list = self.class_template["class_name"].tolist()
-        df_class = df_teacher[class_list]
+        index = self.schedule_index(ignore=ignore, schedule_file=schedule_file)
 
         # 获取可以跳过重复检测的科目
-        repeated = self._read_excel_with_cache(
-            os.path.join(self.lesson_dir, "checkTemplate.xlsx"), sheet_name="repeated"
-        )["subject"].tolist()
-
-        repeated_lines = []
-        for index, row in df_class.iterrows():
-            duplicates = row[row.duplicated()].to_dict()
-            if duplicates:
-                for k, v in duplicates.items():
-                    if v != "-":
-                        subject = df_subject.loc[index, k]
-                        if subject not in repeated:
-                            repeated_lines.append(f"第{index + 2}行: {k} - {v}")
+        repeated = self.template_sheet("repeated")["subject"].tolist()
+
+        repeated_lines = [
+            f"第{row + 2}行: {class_name} - {teacher}"
+            for row, class_name, teacher in index.repeated_teachers(class_list, repeated)
+        ]
 
         if repeated_lines:
             error_msg = self.ERROR_MESSAGES["REPEATED_SUBJECTS"].format(
@@ -868,7 +956,7 @@ class Lesson:
                 return result
 
             # 检查重复科目
-            result = self._check_repeated_subjects(df, ignore=ignore)
+            result = self._check_repeated_subjects(schedule_file, ignore=ignore)
             if result != "ok":
                 return result
 
@@ -941,10 +1029,13 @@ class Lesson:
             old_schedule_file = os.path.join(
                 history_dir, self.sorted_schedule_file(history_dir, monday)[0]
             )
-        old_df = self._read_excel_with_cache(old_schedule_file)
         new_df = self._read_excel_with_cache(new_schedule_file)
-        old_df_teacher = self.repalce_subject_teacher(old_df, ignore=ignore)
-        new_df_teacher = self.repalce_subject_teacher(new_df, ignore=ignore)
+        old_df_teacher = self.schedule_index(
+            ignore=ignore, schedule_file=old_schedule_file
+        ).teacher_frame()
+        new_df_teacher = self.schedule_index(
+            ignore=ignore, schedule_file=new_schedule_file
+        ).teacher_frame()
         class_list = self.class_template["class_name"].tolist()
         # 创建一个与new_df相同形状的DataFrame来存储差异
         diff_df = pd.DataFrame(index=new_df.index, columns=new_df.columns)
@@ -999,28 +1090,14 @@ class Lesson:
         if week_next:
             class_name = class_name.replace("下周", "")
 
-        schedule_data = self._get_schedule_data(week_next)
-        if schedule_data is None:
-            return None
-
         try:
-            # Read the current schedule file and keep only the required columns
-            required_columns = ["date", "week", "order", class_name]
-            df = self.repalce_subject_teacher(
-                schedule_data, teacher_flag=False, week_next=week_next, ignore=False
-            )
-            df = df[required_columns]
-            # Group by 'week' and aggregate class_name into a list
-            grouped_df = df.groupby("week")[class_name].apply(list).reset_index()
-            # Create a new DataFrame with 'week' as columns and corresponding class_name values
-            new_df = pd.DataFrame(
-                grouped_df[class_name].tolist(), index=grouped_df["week"]
-            )
-            new_df.columns = df["order"][: new_df.shape[1]]
-            new_df.index.name = "星期"
-            new_df.columns.name = "节次"
-            new_df = new_df.map(lambda x: "-" if x is None else x)
-            return new_df.T
+            index = self.schedule_index(week_next)
+            if index is None:
+                return None
+            class_df = index.class_grid(class_name)
+            if class_df is None:
+                log.error(f"课表中没有班级: {class_name}")
+            return class_df
         except Exception as e:
             log.error(f"Error processing schedule file: {e}")
             return None
@@ -1131,45 +1208,26 @@ class Lesson:
         self, teacher_name: str, week_next: bool = False
     ) -> pd.DataFrame:
         """获取老师的课表"""
-        schedule_data = self._get_schedule_data(week_next)
-        if schedule_data is None:
+        try:
+            index = self.schedule_index(week_next)
+        except Exception as e:
+            log.error(f"读取课表文件失败: {str(e)}")
             return pd.DataFrame()
-
-        df_subject = self.repalce_subject_teacher(
-            schedule_data, teacher_flag=False, week_next=week_next
-        )
-        df = self.repalce_subject_teacher(
-            schedule_data, teacher_flag=True, week_next=week_next
-        )
-        grouped_df = df[["week", "order"]].groupby("week")
-        # Find the group with the maximum length
-        max_length_group = max(grouped_df, key=lambda x: len(x[1]))
-        max_length_week = max_length_group[0]
-        # Filter the DataFrame to only include rows from the max length week
-        schedule_order = df[df["week"] == max_length_week]["order"].tolist()
-        week_list = list(grouped_df.groups.keys())
-        teacher_df = pd.DataFrame(columns=week_list, index=schedule_order)
-        # Filter the DataFrame to only include rows where the teacher is present
-        teacher_schedule = df[df.isin([teacher_name]).any(axis=1)]
-        for index, row in teacher_schedule.iterrows():
-            week = row["week"]
-            order = row["order"]
-            teacher_column = row.index[row == teacher_name][0]
-            teacher_subject = df_subject.loc[index, teacher_column]
-            teacher_df.loc[order, week] = (
-                f"{teacher_column}-{teacher_subject}"
-                if teacher_subject
-                else teacher_column
-            )
-        return teacher_df
+        if index is None:
+            return pd.DataFrame()
+        return index.teacher_grid(teacher_name)
 
     def today_schedule(self) -> pd.DataFrame:
         """获取今天的课表"""
-        schedule_data = self._get_schedule_data()
-        if schedule_data is None:
+        schedule_file = self._schedule_file()
+        if schedule_file is None:
             return pd.DataFrame()
 
-        df = self.format_schedule(schedule_data)
+        try:
+            df = self.format_schedule(schedule_file)
+        except Exception as e:
+            log.error(f"读取课表文件失败: {str(e)}")
+            return pd.DataFrame()
         df["date"] = df["date"].astype(str)
         today = str(int(datetime.today().strftime("%d")))
         today_df = df[df["date"] == today]
@@ -1266,8 +1324,13 @@ async def update_schedule(record: any):
     content = record.content
     title = re.match(r"^\[文件\] 课表(\d{8}.*)\.xlsx$", content).group(1)
     if title:
+        import asyncio
+
         l = Lesson()
-        result = l.update_schedule(record.msg_id, title, record.msg_id)
+        # 下载课表（轮询等待文件就绪）和检查课表都是阻塞操作，放到线程中执行，不阻塞事件循环
+        result = await asyncio.get_event_loop().run_in_executor(
+            None, l.update_schedule, record.msg_id, title, record.msg_id
+        )
         if result == 1:
             # '通知所有老师本周课表变动'
             for a in l.admin:
@@ -1279,7 +1342,7 @@ async def update_schedule(record: any):
         elif result == 5:
             teachers = []
             # '通知相关老师课表变动'
-            diffs = l.schedule_diff()
+            diffs = await asyncio.get_event_loop().run_in_executor(None, l.schedule_diff)
             if diffs != ([], []):
                 task = []
                 class_diff = diffs[0]
@@ -1313,8 +1376,6 @@ async def update_schedule(record: any):
                             )
                         )
                 if task:
-                    import asyncio
-
                     await asyncio.gather(*task)
                 teachers = set(teachers)
                 tips = "微调课表已通知以下老师:"
@@ -1413,8 +1474,8 @@ async def process_and_send_image(
             pic_path = df_png[0][len(lesson.lesson_dir) :].replace("\\", "/")
             # 发送图片
             if tips:
-                send_text(f"你的课有调整，请注意查看！", wxid)
-            send_image(pic_path, wxid, producer)
+                send_text(f"你的课有调整，请注意查看！", wxid, priority="bulk")
+            send_image(pic_path, wxid, producer, priority="bulk")
             print(title)
 
 
@@ -1437,8 +1498,8 @@ async def process_and_send_class_image(
             wxids = lesson.get_wxids(class_name)
             for wxid in wxids:
                 if tips:
-                    send_text(f"你们班：有调课请注意查看！", wxid)
-                send_image(pic_path, wxid, producer)
+                    send_text(f"你们班：有调课请注意查看！", wxid, priority="bulk")
+                send_image(pic_path, wxid, producer, priority="bulk")
                 print(title)
 
 
@@ -1695,7 +1756,7 @@ def group_send(xlsx_file, sender):
             wxids = l.get_wxids(name)
             for wxid in wxids:
                 if row["类型"] == "消息":
-                    send_text(f"{row['消息内容']}", wxid)
+                    send_text(f"{row['消息内容']}", wxid, priority="bulk")
                     log.info(f"{str(cnt)} {name} 已通知")
                 if row["类型"] == "课表":
                     teacher_name = name
@@ -1713,7 +1774,7 @@ def group_send(xlsx_file, sender):
                             send_text(f"{teacher_name}的课表不存在", wxid)
                         else:
                             pic_path = df_png[len(l.lesson_dir) :].replace("\\", "/")
-                            send_image(pic_path, wxid, "lesson")
+                            send_image(pic_path, wxid, "lesson", priority="bulk")
                     else:
                         df = l.get_teacher_schedule(teacher_name, week_next=week_next)
                         if df.empty:
@@ -1725,7 +1786,7 @@ def group_send(xlsx_file, sender):
                                 title = f"{teacher_name}的课表"
                             df_png = l.df_to_png(df, f"{wxid}.png", title=title)[0]
                             pic_path = df_png[len(l.lesson_dir) :].replace("\\", "/")
-                            send_image(pic_path, wxid, "lesson")
+                            send_image(pic_path, wxid, "lesson", priority="bulk")
             cnt += 1
         except KeyError as e:
             log.error(f"KeyError: {str(e)}")
@@ -1749,7 +1810,7 @@ async def mass_message(record: any):
         title = re.sub(r"\d+", "", title)
         notice_file = f'{title}-{time.strftime("%Y%m%d%H%M%S", time.localtime())}.xlsx'
         new_notice_file = os.path.join(l.lesson_dir, "notice", notice_file)
-        response_path = down_file(record.msg_id, new_notice_file)
+        response_path = await adown_file(record.msg_id, new_notice_file)
         if response_path == "":
             send_text("通知文件下载失败，请重新发送该文件！", record.roomid)
             return
@@ -1799,7 +1860,6 @@ async def sunday_record(record: any):
         try:
             wxid = l.get_wxids(receive)[0]
             send_app_msg(app_xml, wxid)
-            time.sleep(3)
         except Exception as e:
             log.error(f"发送失败：{str(e)}")
             send_text(f"发送失败：{str(e)}", record.roomid)
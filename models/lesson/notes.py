@@ -6,6 +6,8 @@ import re
 import sqlite3
 import time
 
+import database
+
 from sendqueue import send_text
 
 from config.config import Config
@@ -17,12 +19,12 @@ log = LogConfig().get_logger()
 
 class Notes:
     def __enter__(self, db="databases/notes.db"):
-        self.__conn__ = sqlite3.connect(db)
+        self.__conn__ = database.connect(db)
         self.__cursor__ = self.__conn__.cursor()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.__conn__.close()
+        database.release(self.__conn__)
 
     def __create_table__(self):
         try:
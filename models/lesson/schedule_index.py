@@ -0,0 +1,182 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# 课表中不是班级的列
+KEY_COLUMNS = ("date", "week", "order")
+
+
+def subject_maps(teacher_template: pd.DataFrame):
+    """
+    由 teachers 表得到 科目 -> 老师、科目 -> 简称 的对应关系
+    :return: (subject_teacher, subject_short)
+    """
+    subject_teacher = {}
+    subject_short = {}
+    for name, subjects in zip(teacher_template["name"], teacher_template["subject"]):
+        for subj in subjects.split("/"):
+            subject_teacher[subj.strip()] = name
+            subject_short[subj.strip()] = subj[:2]
+    return subject_teacher, subject_short
+
+
+class ScheduleEntry(NamedTuple):
+    """课表中的一节课"""
+
+    week: object  # 星期
+    order: object  # 节次
+    class_name: str
+    subject: str  # 格式化后的科目
+    period: int  # 当天的第几节（从0开始）
+    row: int  # 在课表中的行号
+
+
+class ScheduleIndex:
+    """
+    课表索引，每个课表版本（文件、单双周、模板）构建一次
+    老师 -> 课程列表、科目 -> 课程列表、班级 -> 每天的科目，查询只与结果大小有关
+    科目到老师、简称的对应关系由 subject_maps 生成，repalce_subject_teacher 使用同一份对应关系
+    """
+
+    def __init__(self, df_schedule: pd.DataFrame, teacher_template: pd.DataFrame):
+        """
+        :param df_schedule: format_schedule 格式化后的课表
+        :param teacher_template: checkTemplate.xlsx 的 teachers 表
+        """
+        self.subject_teacher, self.subject_short = subject_maps(teacher_template)
+
+        self.classes = [c for c in df_schedule.columns if c not in KEY_COLUMNS]
+        weeks = df_schedule["week"].tolist()
+        orders = df_schedule["order"].tolist()
+        self.weeks = sorted(set(weeks))
+        self._orders = orders
+        self._index = df_schedule.index
+        # 课程最多的一天的节次作为老师课表的行
+        periods = {week: [] for week in self.weeks}
+        for week, order in zip(weeks, orders):
+            periods[week].append(order)
+        self.periods = max(periods.values(), key=len) if periods else []
+
+        self._grid = {c: {week: [] for week in self.weeks} for c in self.classes}
+        self._by_teacher = {}
+        self._by_subject = {}
+        counts = dict.fromkeys(self.weeks, 0)
+        values = df_schedule[self.classes].to_numpy(dtype=object)
+        self._values = values
+        for row, (week, order) in enumerate(zip(weeks, orders)):
+            period = counts[week]
+            counts[week] += 1
+            for class_name, subject in zip(self.classes, values[row]):
+                self._grid[class_name][week].append(subject)
+                if not isinstance(subject, str) or subject == "-":
+                    continue
+                entry = ScheduleEntry(week, order, class_name, subject, period, row)
+                teacher = self.teacher_of(subject)
+                self._by_teacher.setdefault(teacher, []).append(entry)
+                self._by_subject.setdefault(subject, []).append(entry)
+
+    def teacher_entries(self, teacher_name: str) -> list:
+        """老师的所有课程，按课表顺序"""
+        return list(self._by_teacher.get(teacher_name, []))
+
+    def subject_entries(self, subjects) -> list:
+        """任一科目的所有课程，按课表顺序"""
+        entries = []
+        for subject in set(subjects):
+            entries.extend(self._by_subject.get(subject, []))
+        position = {c: i for i, c in enumerate(self.classes)}
+        return sorted(entries, key=lambda e: (e.row, position[e.class_name]))
+
+    def class_days(self, class_name: str) -> dict:
+        """班级每天的科目 {星期: [科目, ...]}，班级不存在时返回空字典"""
+        days = self._grid.get(class_name, {})
+        return {week: list(subjects) for week, subjects in days.items()}
+
+    def teacher_of(self, subject):
+        """科目对应的老师，没有对应老师时返回科目本身"""
+        return self.subject_teacher.get(subject, subject)
+
+    def short_subject(self, subject):
+        return self.subject_short.get(subject, subject)
+
+    def teacher_frame(self) -> pd.DataFrame:
+        """班级列的科目替换为老师后的课表，行与格式化后的课表相同"""
+        return pd.DataFrame(
+            [
+                [
+                    self.teacher_of(s) if isinstance(s, str) and s != "-" else s
+                    for s in row
+                ]
+                for row in self._values
+            ],
+            index=self._index,
+            columns=self.classes,
+            dtype=object,
+        )
+
+    def repeated_teachers(self, class_names, skip_subjects=()) -> list:
+        """
+        同一节课在 class_names 中多个班级上课的老师
+        每节课按 class_names 的顺序，第一个班级之外的都算重复，科目在 skip_subjects 中的不算
+        :return: [(行索引, 班级, 老师)]，按课表顺序
+        """
+        position = {c: i for i, c in enumerate(class_names)}
+        skip_subjects = set(skip_subjects)
+        repeated = []
+        for teacher, entries in self._by_teacher.items():
+            by_row = {}
+            for entry in entries:
+                if entry.class_name in position:
+                    by_row.setdefault(entry.row, []).append(entry)
+            for row, same_row in by_row.items():
+                if len(same_row) < 2:
+                    continue
+                same_row.sort(key=lambda e: position[e.class_name])
+                for entry in same_row[1:]:
+                    if entry.subject not in skip_subjects:
+                        repeated.append((row, entry.class_name, teacher))
+        repeated.sort(key=lambda r: (r[0], position[r[1]]))
+        return [(self._index[row], class_name, teacher) for row, class_name, teacher in repeated]
+
+    def teacher_grid(self, teacher_name: str) -> pd.DataFrame:
+        """老师的课表，行为节次、列为星期，单元格为 班级-科目简称"""
+        cells = {}
+        seen = set()
+        for entry in self._by_teacher.get(teacher_name, []):
+            # 同一节课有多个班级时只取第一个
+            if entry.row in seen:
+                continue
+            seen.add(entry.row)
+            subject = self.short_subject(entry.subject)
+            cells[(entry.order, entry.week)] = (
+                f"{entry.class_name}-{subject}" if subject else entry.class_name
+            )
+        # 其他天有、课程最多的一天没有的节次放在最后
+        periods = set(self.periods)
+        index = list(self.periods)
+        index += list(dict.fromkeys(o for o, _ in cells if o not in periods))
+        return pd.DataFrame(
+            [[cells.get((order, week), np.nan) for week in self.weeks] for order in index],
+            index=index,
+            columns=self.weeks,
+            dtype=object,
+        )
+
+    def class_grid(self, class_name: str) -> pd.DataFrame:
+        """班级的课表（科目简称），行为节次、列为星期，班级不存在时返回None"""
+        days = self._grid.get(class_name)
+        if days is None:
+            return None
+        new_df = pd.DataFrame(
+            [[self.short_subject(s) for s in subjects] for subjects in days.values()],
+            index=list(days),
+        )
+        new_df.columns = self._orders[: new_df.shape[1]]
+        new_df.index.name = "星期"
+        new_df.columns.name = "节次"
+        new_df = new_df.map(lambda x: "-" if x is None else x)
+        return new_df.T
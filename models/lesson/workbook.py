@@ -0,0 +1,270 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import pandas as pd
+
+from config.config import Config
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+# 解析结果的快照保存在 Excel 所在目录的 .snapshot 子目录
+# 注意：快照是 pickle，加载时可以执行任意代码。只能放在只有本程序可写的目录中，
+# Excel 在共享目录（其他用户或程序可写）时应使用 snapshot=False
+SNAPSHOT_DIR = ".snapshot"
+
+
+def _frame_bytes(data) -> int:
+    """DataFrame（或 sheet_name=None/列表 时的 {sheet: DataFrame}）占用的内存"""
+    if isinstance(data, dict):
+        return sum(_frame_bytes(df) for df in data.values())
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+def _file_hash(path) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _copy(data):
+    if isinstance(data, dict):
+        return {sheet: df.copy() for sheet, df in data.items()}
+    return data.copy()
+
+
+class WorkbookCache:
+    """
+    Excel 读取缓存
+    键为 (路径, mtime, 大小, sheet, 读取参数)，文件修改后自动重新读取，旧版本立即丢弃
+    按最近使用淘汰，缓存的 DataFrame 总内存不超过 max_mb
+    返回副本，调用方修改返回的 DataFrame 不影响缓存
+    内存中没有时先读 .snapshot 中的快照（pickle），快照对应的文件内容（sha1）变化后才重新解析 Excel
+    快照先写临时文件再 os.replace，读取失败（损坏、过期）时重新解析 Excel 并重写快照
+    pickle 不可信：能写入 .snapshot 目录的人可以让本程序执行任意代码，共享目录中不要开启快照
+    """
+
+    def __init__(self, max_mb=256, snapshot=True):
+        """
+        :param max_mb: 缓存占用内存上限（MB）
+        :param snapshot: 是否使用快照
+        """
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.snapshot = snapshot
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.snapshot_hits = 0
+
+    @classmethod
+    def from_config(cls):
+        """使用 config.yaml 中的 workbook_cache 配置"""
+        options = Config().get_dict("workbook_cache")
+        return cls(**options)
+
+    @staticmethod
+    def _key(path, stat, sheet_name, kwargs):
+        return (
+            path,
+            stat.st_mtime_ns,
+            stat.st_size,
+            repr(sheet_name),
+            repr(sorted(kwargs.items())),
+        )
+
+    @staticmethod
+    def _snapshot_path(path, sheet_name, kwargs) -> str:
+        options = hashlib.sha1(
+            repr((sheet_name, sorted(kwargs.items()))).encode("utf-8")
+        ).hexdigest()[:12]
+        return os.path.join(
+            os.path.dirname(path), SNAPSHOT_DIR, f"{os.path.basename(path)}.{options}.pkl"
+        )
+
+    @staticmethod
+    def _load_snapshot(snapshot_path, path, stat):
+        """
+        读取快照
+        :return: (解析结果, 源文件 sha1)，快照不存在或已过期时解析结果为 None
+        """
+        try:
+            with open(snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            log.warning(f"读取快照失败，重新解析: {snapshot_path} {e}")
+            return None, None
+        # mtime 和大小没变时不需要计算 sha1
+        if snapshot["mtime_ns"] == stat.st_mtime_ns and snapshot["size"] == stat.st_size:
+            return snapshot["data"], snapshot["sha1"]
+        source_hash = _file_hash(path)
+        if snapshot["sha1"] == source_hash:
+            # 文件被 touch 过但内容没变，更新快照中的 mtime，下次不用再计算 sha1
+            WorkbookCache._save_snapshot(snapshot_path, stat, source_hash, snapshot["data"])
+            return snapshot["data"], source_hash
+        return None, source_hash
+
+    @staticmethod
+    def _save_snapshot(snapshot_path, stat, source_hash, data):
+        """先写临时文件再替换，其他进程不会读到写了一半的快照"""
+        try:
+            os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(snapshot_path), suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(
+                        {
+                            "sha1": source_hash,
+                            "mtime_ns": stat.st_mtime_ns,
+                            "size": stat.st_size,
+                            "data": data,
+                        },
+                        f,
+                        protocol=pickle.HIGHEST_PROTOCOL,
+                    )
+                os.replace(tmp_path, snapshot_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            log.warning(f"保存快照失败: {snapshot_path} {e}")
+
+    def _parse(self, path, stat, sheet_name, kwargs):
+        """读取快照或解析 Excel"""
+        if not self.snapshot:
+            return pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl", **kwargs)
+        snapshot_path = self._snapshot_path(path, sheet_name, kwargs)
+        data, source_hash = self._load_snapshot(snapshot_path, path, stat)
+        if data is not None:
+            self.snapshot_hits += 1
+            return data
+        data = pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl", **kwargs)
+        self._save_snapshot(snapshot_path, stat, source_hash or _file_hash(path), data)
+        return data
+
+    def _pop(self, key):
+        _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def read(self, file_path, sheet_name=0, **kwargs):
+        """读取 Excel，参数与 pd.read_excel 相同（engine 固定为 openpyxl）"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        key = self._key(path, stat, sheet_name, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry[0])
+            self.misses += 1
+
+        data = self._parse(path, stat, sheet_name, kwargs)
+        size = _frame_bytes(data)
+
+        with self._lock:
+            # 同一文件的旧版本不会再被读取
+            for old in [
+                k
+                for k in self._entries
+                if k[0] == path and k[1:3] != key[1:3] and k[3:] == key[3:]
+            ]:
+                self._pop(old)
+            if key in self._entries:
+                self._pop(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (data, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self._pop(next(iter(self._entries)))
+            else:
+                log.warning(f"{file_path} 占用 {size // 1024}KB，超过缓存上限，不缓存")
+        return _copy(data)
+
+    def invalidate(self, file_path: str = None):
+        """丢弃缓存，file_path 为空时全部丢弃"""
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+                self.bytes = 0
+                return
+            path = os.path.abspath(file_path)
+            for key in [k for k in self._entries if k[0] == path]:
+                self._pop(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "mb": round(self.bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "snapshot_hits": self.snapshot_hits,
+        }
+
+
+workbook_cache = WorkbookCache.from_config()
+
+
+class TemplateBundle:
+    """
+    checkTemplate.xlsx 一次读取的所有 sheet（teachers、class、class_time、replace、ignore、repeated 等）
+    只读：sheet() 返回副本
+    """
+
+    __slots__ = ("path", "mtime_ns", "size", "_sheets")
+
+    def __init__(self, path, stat, sheets: dict):
+        self.path = path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self._sheets = MappingProxyType(sheets)
+
+    def is_current(self, stat) -> bool:
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+    @property
+    def names(self) -> tuple:
+        return tuple(self._sheets)
+
+    def sheet(self, name: str) -> pd.DataFrame:
+        if name not in self._sheets:
+            raise ValueError(f"{os.path.basename(self.path)} 中没有 {name} 表")
+        return self._sheets[name].copy()
+
+
+_bundles = {}
+_bundles_lock = threading.Lock()
+
+
+def template_bundle(file_path: str) -> TemplateBundle:
+    """
+    读取模板文件的所有 sheet（打开一次工作簿），文件修改后重新读取
+    Lesson 和 datas_api 共用
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    bundle = _bundles.get(path)
+    if bundle is not None and bundle.is_current(stat):
+        return bundle
+    with _bundles_lock:
+        bundle = _bundles.get(path)
+        if bundle is None or not bundle.is_current(stat):
+            # sheet_name=None：一次解析出所有 sheet
+            bundle = TemplateBundle(path, stat, workbook_cache.read(path, sheet_name=None))
+            _bundles[path] = bundle
+    return bundle
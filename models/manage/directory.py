@@ -0,0 +1,176 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import threading
+import time
+from collections import OrderedDict
+
+import database
+from config.config import Config
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+# 负缓存的值：数据库中没有这个 id
+MISSING = object()
+
+
+class ContactDirectory:
+    """
+    联系人/群名称的进程内缓存
+    命中直接返回；未命中查本地数据库；数据库也没有时记一条负缓存，并在后台线程从微信同步一次，
+    同一时间只有一个同步在跑，并发的未命中共用这一次同步，两次同步之间至少间隔 refresh_interval 秒
+    """
+
+    def __init__(
+        self,
+        name: str,
+        query: str,
+        refresh,
+        default: tuple,
+        db="databases/member.db",
+        ttl=600,
+        negative_ttl=60,
+        max_size=5000,
+        refresh_interval=300,
+    ):
+        """
+        :param name: 名称，用于日志
+        :param query: 按 id 查询的 SQL
+        :param refresh: 从微信同步到本地数据库的函数
+        :param default: 查不到时返回的值
+        :param ttl: 缓存有效期（秒）
+        :param negative_ttl: 负缓存有效期（秒）
+        :param max_size: 最多缓存的条数，超出时淘汰最久未使用的
+        :param refresh_interval: 两次后台同步的最小间隔（秒）
+        """
+        self.name = name
+        self.query = query
+        self.refresh = refresh
+        self.default = default
+        self.db = db
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._last_refresh = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @classmethod
+    def from_config(cls, name: str, query: str, refresh, default: tuple):
+        """使用 config.yaml 中的 contact_directory 配置"""
+        options = Config().get_dict("contact_directory")
+        return cls(name, query, refresh, default, **options)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key, value):
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _select(self, key):
+        conn = database.connect(self.db)
+        try:
+            row = conn.execute(self.query, (key,)).fetchone()
+        finally:
+            database.release(conn)
+        return tuple(row) if row else MISSING
+
+    def _run_refresh(self, done: threading.Event):
+        try:
+            self.refresh()
+        except Exception as e:
+            log.error(f"同步{self.name}失败: {e}")
+        finally:
+            self.invalidate()
+            with self._lock:
+                self._last_refresh = time.monotonic()
+                self._refreshing = None
+            done.set()
+
+    def schedule_refresh(self, force: bool = False):
+        """
+        在后台同步一次，已有同步在跑时复用它
+        :param force: 忽略 refresh_interval
+        :return: 同步完成时 set 的 Event；因间隔限制没有同步时返回 None
+        """
+        with self._lock:
+            if self._refreshing is not None:
+                return self._refreshing
+            if (
+                not force
+                and time.monotonic() - self._last_refresh < self.refresh_interval
+            ):
+                return None
+            done = self._refreshing = threading.Event()
+            self.refreshes += 1
+        threading.Thread(
+            target=self._run_refresh,
+            args=(done,),
+            name=f"refresh-{self.name}",
+            daemon=True,
+        ).start()
+        return done
+
+    def lookup(self, key: str, wait: bool = False, timeout: float = 60) -> tuple:
+        """
+        查询名称
+        :param wait: 未命中时是否等待同步完成后再查一次（同步调用，会阻塞）
+        :param timeout: 等待同步的最长时间（秒）
+        """
+        value = self._get(key)
+        if value is not None and (value is not MISSING or not wait):
+            self.hits += 1
+            return self.default if value is MISSING else value
+        self.misses += 1
+        try:
+            value = self._select(key)
+        except Exception as e:
+            log.error(f"查询{self.name}失败: {key} {e}")
+            return self.default
+        if value is MISSING:
+            done = self.schedule_refresh(force=wait)
+            if wait and done is not None and done.wait(timeout):
+                try:
+                    value = self._select(key)
+                except Exception as e:
+                    log.error(f"查询{self.name}失败: {key} {e}")
+                    return self.default
+        self._put(key, value)
+        return self.default if value is MISSING else value
+
+    def invalidate(self, key: str = None):
+        """丢弃缓存，key 为空时全部丢弃"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refreshing": self._refreshing is not None,
+        }
@@ -6,26 +6,21 @@ from config.config import Config
 from sendqueue import send_text, send_image
 from models.manage.member import Member
 from models.api import ju_pai
-import json
-import requests
-from time import sleep
+import jsoncodec
 from client import Client
+from forwarder import forwarder
 
 
 async def forward_msg(msg):
+    """
+    转发消息：放入后台转发缓冲区后立即返回，不等待转发目标
+    :param msg: 原始请求体（bytes/str，原样转发）或消息字典
+    """
     urls = Config().get_config("forward_url")
     if not urls or len(urls) == 0:
         return
-    payload = json.dumps(msg)
-    headers = {"User-Agent": "tech_t", "Content-Type": "application/json"}
-    for url in urls:
-        try:
-            response = requests.request("POST", url, headers=headers, data=payload)
-            if response:
-                return response
-        except:
-            pass
-        sleep(1)
+    payload = msg if isinstance(msg, (bytes, str)) else jsoncodec.dumpb(msg)
+    forwarder.put(payload)
 
 
 async def command_manul(record):
@@ -4,10 +4,37 @@
 
 import re
 import sqlite3
+import database
 from config.log import LogConfig
 from config.config import Config
 from client import Client
 from sendqueue import send_text
+from rules import rule_engine
+from models.manage.directory import ContactDirectory
+
+database.register_migration(
+    "databases/member.db",
+    1,
+    "联系人、群、会员、权限查询索引",
+    [
+        # 覆盖索引：wxid_remark / chatroom_name 不需要回表
+        "CREATE INDEX IF NOT EXISTS idx_contacts_wxid ON contacts(wxid, remark, nick_name)",
+        "CREATE INDEX IF NOT EXISTS idx_chatroom_roomid ON chatroom(roomid, room_name)",
+        "CREATE INDEX IF NOT EXISTS idx_member_uuid ON member(uuid)",
+        "CREATE INDEX IF NOT EXISTS idx_permission_func ON permission(func)",
+    ],
+)
+database.register_migration(
+    "databases/member.db",
+    2,
+    "联系人、群 id 唯一（同步使用 UPSERT）",
+    [
+        "DELETE FROM contacts WHERE id NOT IN (SELECT MIN(id) FROM contacts GROUP BY wxid)",
+        "DELETE FROM chatroom WHERE id NOT IN (SELECT MIN(id) FROM chatroom GROUP BY roomid)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_wxid ON contacts(wxid)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_chatroom_roomid ON chatroom(roomid)",
+    ],
+)
 
 
 class Member:
@@ -17,13 +44,12 @@ class Member:
         self.log = LogConfig().get_logger()
 
     def __enter__(self, db="databases/member.db"):
-        self.__conn__ = sqlite3.connect(db)
+        self.__conn__ = database.connect(db)
         self.__cursor__ = self.__conn__.cursor()
         return self
 
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
-        if self.__conn__:
-            self.__conn__.close()
+        database.release(self.__conn__)
 
     def __create_table__(self):
         try:
@@ -144,6 +170,26 @@ class Member:
         contacts = client.contact_info(content_type)
         return contacts
 
+    @staticmethod
+    def wx_contact_pages(content_type, fields):
+        """按页获取微信联系人，每页返回 fields 对应值的行列表"""
+        for _, _, contacts in Client().iter_contact_pages(content_type):
+            yield [tuple(contact[f] for f in fields) for contact in contacts]
+
+    @staticmethod
+    def sync_contact_pages(content_type, fields, table, key, columns):
+        """
+        每获取一页就写入该页的新增和变化，不等所有页获取完成
+        :return: 各页 database.sync_rows 结果的合计
+        """
+        total = dict.fromkeys(("inserted", "updated", "deleted", "unchanged", "seconds"), 0)
+        for rows in Member.wx_contact_pages(content_type, fields):
+            report = database.sync_rows("databases/member.db", table, key, columns, rows)
+            for k in total:
+                total[k] += report[k]
+        total["seconds"] = round(total["seconds"], 3)
+        return total
+
     def db_contacts(self):
         """获取数据库联系人"""
         with self as m:
@@ -159,137 +205,68 @@ class Member:
         return chatroom
 
     def update_contacts(self):
-        """更新本地数据库联系人"""
-        contacts_list = self.wx_contacts()
-        contacts = self.db_contacts()
-        updated_count = 0
-        insert_count = 0
+        """
+        更新本地数据库联系人，只写入新增和有变化的联系人
+        微信中已不存在的联系人不删除（本地的 notes 要保留）
+        """
         try:
-            with self as m:
-                for contact in contacts_list:
-                    if contact["friendid"] not in contacts:
-                        m.__cursor__.execute(
-                            """
-                            INSERT INTO contacts (wxid, wxid_re, remark, nick_name, phone, sex, city, province, country, notes)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """,
-                            (
-                                contact["friendid"],
-                                contact["friend_wechatno"],
-                                contact["memo"],
-                                contact["nickname"],
-                                contact["phone"],
-                                contact["gender"],
-                                contact["city"],
-                                contact["province"],
-                                contact["country"],
-                                "",
-                            ),
-                        )
-                        insert_count += m.__cursor__.rowcount
-                    else:
-                        m.__cursor__.execute(
-                            """
-                            UPDATE contacts SET wxid_re = ?, remark = ?, nick_name = ?, phone = ?, sex = ?, city = ?, province = ?, country = ?
-                            WHERE wxid = ?
-                        """,
-                            (
-                                contact["friend_wechatno"],
-                                contact["memo"],
-                                contact["nickname"],
-                                contact["phone"],
-                                contact["gender"],
-                                contact["city"],
-                                contact["province"],
-                                contact["country"],
-                                contact["friendid"],
-                            ),
-                        )
-                        updated_count += m.__cursor__.rowcount
-                self.__conn__.commit()
-
-            if updated_count > 0 or insert_count > 0:
-                self.log.info(f"更新联系人成功，更新{updated_count}条数据")
-                self.log.info(f"插入联系人成功，插入{insert_count}条数据")
-                return True
-            else:
-                self.log.info("联系人无更新")
-                return False
+            report = self.sync_contact_pages(
+                0,
+                (
+                    "friendid",
+                    "friend_wechatno",
+                    "memo",
+                    "nickname",
+                    "phone",
+                    "gender",
+                    "city",
+                    "province",
+                    "country",
+                ),
+                "contacts",
+                "wxid",
+                ("wxid_re", "remark", "nick_name", "phone", "sex", "city", "province", "country"),
+            )
         except Exception as e:
             self.log.error(f"更新联系人失败：{e}")
             return False
+        self.log.info(
+            f"同步联系人：新增{report['inserted']}条，更新{report['updated']}条，"
+            f"删除{report['deleted']}条，未变化{report['unchanged']}条，耗时{report['seconds']}s"
+        )
+        return report["inserted"] + report["updated"] + report["deleted"] > 0
 
     def update_chatroom(self):
-        """更新本地数据库群聊"""
-        wx_chatroom = self.wx_contacts(1)
-        # print(wx_chatroom)
-        chatroom_list = self.db_chatroom()
-        updated_count = 0
+        """
+        更新本地数据库群聊，只写入新增和有变化的群聊
+        群聊列表只包含保存到通讯录的群，本地的群不删除
+        """
         try:
-            for chatroom in wx_chatroom:
-                with self as m:
-                    if chatroom["friendid"] not in chatroom_list:
-                        m.__cursor__.execute(
-                            """
-                            INSERT INTO chatroom (roomid, room_name)
-                            VALUES (?,?)
-                        """,
-                            (chatroom["friendid"], chatroom["nickname"]),
-                        )
-                        self.__conn__.commit()
-                        updated_count += m.__cursor__.rowcount
-                    else:
-                        m.__cursor__.execute(
-                            """
-                            UPDATE chatroom SET room_name =?
-                            WHERE roomid =?
-                        """,
-                            (chatroom["nickname"], chatroom["friendid"]),
-                        )
-                        self.__conn__.commit()
-                        updated_count += m.__cursor__.rowcount
-
-            if updated_count > 0:
-                self.log.info(f"更新群聊成功，更新{updated_count}条数据")
-                return True
-            else:
-                self.log.info("群聊无更新")
-                return False
+            report = self.sync_contact_pages(
+                1, ("friendid", "nickname"), "chatroom", "roomid", ("room_name",)
+            )
         except Exception as e:
             self.log.error(f"更新群聊失败：{e}")
             return False
-
-    def wxid_remark(self, wxid):
-        """获取微信联系人备注"""
-        with self as m:
-            m.__cursor__.execute(
-                "SELECT remark, nick_name FROM contacts WHERE wxid =?", (wxid,)
-            )
-            result = m.__cursor__.fetchone()
-            if not result:
-                self.update_contacts()
-                with self as m:
-                    m.__cursor__.execute(
-                        "SELECT remark, nick_name FROM contacts WHERE wxid =?", (wxid,)
-                    )
-                    result = m.__cursor__.fetchone()
-        return result if result else ("", "")
-
-    def chatroom_name(self, roomid):
-        """获取群聊名称"""
-        with self as m:
-            m.__cursor__.execute(
-                "SELECT room_name FROM chatroom WHERE roomid =?", (roomid,)
-            )
-            result = m.__cursor__.fetchone()
-            if not result:
-                self.update_chatroom()
-                with self as m:
-                    m.__cursor__.execute(
-                        "SELECT room_name FROM chatroom WHERE roomid =?", (roomid,)
-                    )
-                    result = m.__cursor__.fetchone()
-        return result if result else ("",)
+        self.log.info(
+            f"同步群聊：新增{report['inserted']}条，更新{report['updated']}条，"
+            f"删除{report['deleted']}条，未变化{report['unchanged']}条，耗时{report['seconds']}s"
+        )
+        return report["inserted"] + report["updated"] + report["deleted"] > 0
+
+    def wxid_remark(self, wxid, wait=False):
+        """
+        获取微信联系人备注
+        :param wait: 本地没有时是否等待从微信同步完成（会阻塞，webhook 中不要使用）
+        """
+        return contacts_directory.lookup(wxid, wait=wait)
+
+    def chatroom_name(self, roomid, wait=False):
+        """
+        获取群聊名称
+        :param wait: 本地没有时是否等待从微信同步完成（会阻塞，webhook 中不要使用）
+        """
+        return chatroom_directory.lookup(roomid, wait=wait)
 
     def insert_member(
         self,
@@ -398,6 +375,7 @@ class Member:
                 ),
             )
             self.__conn__.commit()
+            rule_engine.invalidate()
             return m.__cursor__.rowcount
 
     def delte_permission(self, id):
@@ -405,6 +383,7 @@ class Member:
         with self as m:
             m.__cursor__.execute("DELETE FROM permission WHERE id =?", (id,))
             self.__conn__.commit()
+            rule_engine.invalidate()
             return m.__cursor__.rowcount
 
     def permission_info(self, func=""):
@@ -433,6 +412,7 @@ class Member:
                 "UPDATE permission SET activate =? WHERE id =?", (1, id)
             )
             self.__conn__.commit()
+            rule_engine.invalidate()
             return m.__cursor__.rowcount
 
     def deactivate_func(self, id):
@@ -442,9 +422,25 @@ class Member:
                 "UPDATE permission SET activate =? WHERE id =?", (0, id)
             )
             self.__conn__.commit()
+            rule_engine.invalidate()
             return m.__cursor__.rowcount
 
 
+
+contacts_directory = ContactDirectory.from_config(
+    "联系人",
+    "SELECT remark, nick_name FROM contacts WHERE wxid = ?",
+    lambda: Member().update_contacts(),
+    ("", ""),
+)
+chatroom_directory = ContactDirectory.from_config(
+    "群聊",
+    "SELECT room_name FROM chatroom WHERE roomid = ?",
+    lambda: Member().update_chatroom(),
+    ("",),
+)
+
+
 async def query_permission(record):
     """查询权限"""
     text = record.content
@@ -591,7 +587,7 @@ async def add_member(record):
                     send_text(f"会员已存在: {mb}", record.sender)
                 else:
                     name = ""
-                    alias = m.wxid_remark(mb)
+                    alias = m.wxid_remark(mb, wait=True)
                     if alias:
                         name = alias[0] if alias[0] else alias[1]
                     print(name, alias)
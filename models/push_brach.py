@@ -1,11 +1,13 @@
+import asyncio
 import os
-import sys
 import getpass
 from git import Repo, GitCommandError
+import httpx
 import requests
 from config.config import Config
 from datetime import datetime
 from client import Client
+from transport import transport
 from sendqueue import send_text
 from config.log import LogConfig
 
@@ -137,53 +139,72 @@ def push_branch(
         log.error(f"发生错误: {str(e)}")
         return False
 
-def get_qrcode(roomid, png_path):
+async def get_qrcode(roomid, png_path):
     c = Client()
-    r = c.group_qr(roomid)
+    r = await c.group_qr(roomid)
     if r:
-        rsp = requests.get(r, timeout=50)
+        try:
+            rsp = await transport.aget(r, timeout=50)
+        except httpx.HTTPError as e:
+            log.error(f"下载二维码失败: {e}")
+            return False
         if rsp.status_code == 200:
             with open(png_path, "wb") as f:
                 f.write(rsp.content)
-            log.info("二维码已保存到", png_path)
+            log.info(f"二维码已保存到 {png_path}")
             return True
     else:
         log.error("获取二维码失败")
         return False
 
 
-def push_qrcode():
+async def push_room_qrcode(name, roomid, root_path, commit_message, proxy, admin):
+    """获取一个群的二维码并推送到对应的仓库"""
+    repo_path = os.path.join(root_path, 'qrcode', name)
+    png_path = os.path.join(repo_path, "1.png")
+    if await get_qrcode(roomid, png_path):
+        # git 操作是阻塞的，放到线程中执行
+        if await asyncio.to_thread(
+            push_branch, repo_path, "main", commit_message, "origin", proxy=proxy
+        ):
+            send_text(f"{name}二维码推送成功", admin)
+        else:
+            send_text(f"{name}推送失败", admin)
+
+
+async def push_qrcode():
     admin = Config().get_config("admin")
     try:
         # 获取GitHub个人访问令牌
         token = Config().get_config("git_token")
         # 登录GitHub
-        if not login_github(token):
+        if not await asyncio.to_thread(login_github, token):
             log.error("登录失败，程序退出")
             send_text("github登录失败，程序退出", admin)
-            sys.exit(1)
-        
+            return
+
         # 获取群号
         qrcode_git = Config().get_config("qrcode_git")
         if not qrcode_git:
             log.error("未配置群号，程序退出")
             send_text("未配置更新二维码群号，程序退出", admin)
-            sys.exit(1)
+            return
 
-        # 推送二维码
-        branch_name = "main"
+        # 所有群的二维码同时获取和推送
         commit_message = f"自动提交 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        remote_name = "origin"
         proxy = Config().get_config("proxy")
         root_path = Config().get_config("lesson_dir")
-        for name, roomid in qrcode_git.items():
-            repo_path = os.path.join(root_path, 'qrcode', name)
-            png_path = os.path.join(repo_path, "1.png")
-            if get_qrcode(roomid, png_path):
-                if push_branch(repo_path, branch_name, commit_message, remote_name, proxy=proxy):
-                    send_text(f"{name}二维码推送成功", admin)
-                else:
-                    send_text(f"{name}推送失败", admin)
+        results = await asyncio.gather(
+            *[
+                push_room_qrcode(name, roomid, root_path, commit_message, proxy, admin)
+                for name, roomid in qrcode_git.items()
+            ],
+            return_exceptions=True,
+        )
+        for name, result in zip(qrcode_git, results):
+            if isinstance(result, Exception):
+                log.error(f"{name}二维码推送发生错误: {result}")
+                send_text(f"更新{name}二位码发生错误: {result}", admin)
 
     except Exception as e:
         log.error(f"发生错误: {str(e)}")
@@ -10,6 +10,7 @@ import re
 import sqlite3
 import threading
 import time
+import database
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
@@ -24,6 +25,7 @@ from models.lesson.lesson import (
     clear_temp_file,
 )
 from models.push_brach import push_qrcode
+from retention import run_retention
 
 
 def parse_datetime(date_str):
@@ -57,13 +59,12 @@ class Task:
         self.__enter__()
 
     def __enter__(self, db="databases/task.db"):
-        self.__conn__ = sqlite3.connect(db)
+        self.__conn__ = database.connect(db)
         self.__cursor__ = self.__conn__.cursor()
         return self
 
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
-        if self.__conn__:
-            self.__conn__.close()
+        database.release(self.__conn__)
 
     def __create_table__(self):
         try:
@@ -242,6 +243,32 @@ class Task:
             print(f"添加任务到数据库失败: {e}")
             return None
 
+    def ensure_task_in_db(
+        self, func_name, trigger_type, trigger_args, kwargs=None, description=None
+    ):
+        """
+        数据库中没有 func_name 的任务时添加（用于后来新增的默认任务）
+        :return: 任务ID，已存在时返回 None
+        """
+        try:
+            self.__cursor__.execute(
+                "SELECT id FROM tasks WHERE func = ? LIMIT 1", (func_name,)
+            )
+            if self.__cursor__.fetchone():
+                return None
+        except Exception as e:
+            print(f"查询任务失败: {e}")
+            return None
+        return self.add_task_to_db(
+            func_name,
+            trigger_type,
+            trigger_args,
+            kwargs=kwargs,
+            description=description,
+            one_off=False,
+            consumed=False,
+        )
+
     def get_tasks_from_db(self):
         """
         从数据库获取所有启用的任务
@@ -264,8 +291,8 @@ class Task:
         :return: 是否更新成功
         """
         try:
-            # 创建新的数据库连接，确保在当前线程中使用
-            with sqlite3.connect("databases/task.db") as conn:
+            # 使用当前线程的连接
+            with database.connect("databases/task.db") as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "UPDATE tasks SET consumed = ? WHERE id = ? AND one_off = 1",
@@ -365,6 +392,12 @@ async def add_cron_remind(record):
 async def task_start():
     # 首先添加默认任务到数据库（如果不存在）
     init_default_tasks()
+    task_scheduler.ensure_task_in_db(
+        func_name="run_retention",
+        trigger_type="cron",
+        trigger_args=json.dumps({"hour": 4, "minute": 30}),
+        description="每日归档队列和消息",
+    )
 
     # 打印调试信息
     print("开始加载任务...")
@@ -461,6 +494,15 @@ def task_wrapper(func, task_id):
     :return: 包装后的函数
     """
 
+    if asyncio.iscoroutinefunction(func):
+        # 协程任务由调度器在事件循环中执行，包装函数也必须是协程
+        async def async_wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            task_scheduler.update_task_consumed(task_id)
+            return result
+
+        return async_wrapper
+
     def wrapper(*args, **kwargs):
         # 执行原始任务
         result = func(*args, **kwargs)
@@ -489,6 +531,7 @@ def load_tasks_from_db():
         "create_month_dir": create_month_dir,
         "push_qrcode": push_qrcode,
         "clear_temp_file": clear_temp_file,
+        "run_retention": run_retention,
     }
 
     # 从数据库获取所有启用的任务
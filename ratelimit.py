@@ -0,0 +1,152 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import asyncio
+import time
+from collections import OrderedDict
+
+from config.config import Config
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多存 burst 个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now) -> float:
+        """还需要等待多久才有一个令牌"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def take(self):
+        self.tokens -= 1
+
+
+class SendRateLimiter:
+    """
+    发送消息限流
+    全局一个令牌桶（上游接口的承受能力），每个接收人一个令牌桶，群（@chatroom）和好友分别配置
+    自适应（AIMD）：上游出错时全局速率乘以 decrease，之后每成功一次增加 increase，最多恢复到配置的速率
+    """
+
+    def __init__(
+        self,
+        global_rate=10.0,
+        global_burst=20,
+        receiver_rate=1.0,
+        receiver_burst=3,
+        group_rate=0.5,
+        group_burst=3,
+        min_factor=0.1,
+        decrease=0.5,
+        increase=0.02,
+        cooldown=2.0,
+        max_buckets=10000,
+    ):
+        """
+        :param global_rate: 全局每秒发送数
+        :param global_burst: 全局突发数
+        :param receiver_rate: 每个好友每秒发送数
+        :param receiver_burst: 每个好友突发数
+        :param group_rate: 每个群每秒发送数
+        :param group_burst: 每个群突发数
+        :param min_factor: 自适应降速的下限（相对 global_rate）
+        :param decrease: 出错时速率的乘数
+        :param increase: 每次成功速率增加的比例
+        :param cooldown: 两次降速的最小间隔（秒），避免同时失败的请求把速率一次降到底
+        :param max_buckets: 保留的接收人令牌桶数量
+        """
+        self.global_rate = global_rate
+        self.receiver = (receiver_rate, receiver_burst)
+        self.group = (group_rate, group_burst)
+        self.min_factor = min_factor
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self.max_buckets = max_buckets
+        self.factor = 1.0
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets = OrderedDict()
+        self._last_decrease = 0.0
+        self.throttled = 0
+
+    @classmethod
+    def from_config(cls):
+        """使用 config.yaml 中的 rate_limit 配置"""
+        options = Config().get_dict("rate_limit")
+        return cls(**options)
+
+    def _bucket(self, receiver) -> TokenBucket:
+        bucket = self._buckets.get(receiver)
+        if bucket is None:
+            rate, burst = self.group if receiver.endswith("@chatroom") else self.receiver
+            bucket = self._buckets[receiver] = TokenBucket(rate, burst)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(receiver)
+        return bucket
+
+    async def _wait(self, *buckets):
+        throttled = False
+        while True:
+            now = time.monotonic()
+            wait = max(bucket.wait_time(now) for bucket in buckets)
+            if wait <= 0:
+                for bucket in buckets:
+                    bucket.take()
+                return
+            if not throttled:
+                throttled = True
+                self.throttled += 1
+            await asyncio.sleep(wait)
+
+    async def acquire(self, receiver: str):
+        """等待到全局和接收人的令牌都可用"""
+        await self._wait(self._global, self._bucket(receiver))
+
+    async def acquire_receiver(self, receiver: str):
+        """只等待接收人的令牌"""
+        await self._wait(self._bucket(receiver))
+
+    async def acquire_global(self):
+        """只等待全局令牌"""
+        await self._wait(self._global)
+
+    def _set_factor(self, factor):
+        self.factor = min(1.0, max(self.min_factor, factor))
+        self._global.rate = self.global_rate * self.factor
+
+    def on_success(self):
+        if self.factor < 1.0:
+            self._set_factor(self.factor + self.increase)
+
+    def on_error(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._set_factor(self.factor * self.decrease)
+        log.warning(f"上游发送失败，降低发送速率至 {self._global.rate:.2f}/s")
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self._global.rate, 2),
+            "factor": round(self.factor, 2),
+            "throttled": self.throttled,
+        }
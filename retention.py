@@ -0,0 +1,170 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import os
+import sqlite3
+import time
+
+import database
+from config.config import Config
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+ARCHIVE_DIR = "databases/archive"
+
+# 表 -> (数据库, 可归档行的条件, 归档月份表达式)
+# 条件中的 ? 为截止时间：queues 按消费时间 c_time，messages 按 create_time（毫秒）
+POLICIES = {
+    "queues": (
+        "databases/queues.db",
+        "is_consumed = 1 AND c_time != '' AND c_time < ?",
+        "replace(substr(c_time, 1, 7), '-', '')",
+    ),
+    "messages": (
+        "databases/messages.db",
+        "create_time < ?",
+        "strftime('%Y%m', create_time / 1000, 'unixepoch', 'localtime')",
+    ),
+}
+
+
+def _cutoff(table: str, keep_days: int):
+    seconds = time.time() - keep_days * 86400
+    if table == "queues":
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+    return int(seconds * 1000)
+
+
+def _columns(conn, table: str, schema: str = "main") -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _archive_batch(conn, table: str, month: str, ids: list) -> int:
+    """
+    把一批行复制到 {table}-{month}.db 并从原表删除
+    主库是 WAL 模式时，跨两个数据库文件的事务不是原子的，所以分两步：
+    先 INSERT OR IGNORE 复制到归档库（按 id 去重，重复执行没有影响）并提交，
+    再只删除归档库中已经存在的行；中途中断时行仍留在原表，下次归档时重新复制
+    """
+    path = os.path.join(ARCHIVE_DIR, f"{table}-{month}.db")
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        columns = _columns(conn, table)
+        archived = _columns(conn, table, "archive")
+        if not archived:
+            conn.execute(f"CREATE TABLE archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+        else:
+            # 原表后来增加的列（迁移）同样加到归档表
+            for column in columns:
+                if column not in archived:
+                    conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+        index = conn.execute(
+            "SELECT 1 FROM archive.sqlite_master WHERE type = 'index' AND name = ?",
+            (f"uq_{table}_id",),
+        ).fetchone()
+        if index is None:
+            # 以前的归档可能有重复的行，建唯一索引前先去重
+            conn.execute(
+                f"DELETE FROM archive.{table} WHERE rowid NOT IN (SELECT MIN(rowid) FROM archive.{table} GROUP BY id)"
+            )
+            conn.execute(f"CREATE UNIQUE INDEX archive.uq_{table}_id ON {table}(id)")
+            conn.commit()
+
+        placeholders = ",".join("?" * len(ids))
+        column_list = ", ".join(columns)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f"INSERT OR IGNORE INTO archive.{table} ({column_list}) SELECT {column_list} FROM main.{table} WHERE id IN ({placeholders})",
+            ids,
+        )
+        conn.commit()
+
+        conn.execute("BEGIN IMMEDIATE")
+        deleted = conn.execute(
+            f"DELETE FROM main.{table} WHERE id IN ({placeholders}) AND id IN (SELECT id FROM archive.{table})",
+            ids,
+        ).rowcount
+        conn.commit()
+        return deleted
+    finally:
+        database.release(conn)
+        conn.execute("DETACH DATABASE archive")
+
+
+def archive_table(table: str, keep_days: int, batch_size: int = 5000) -> int:
+    """
+    归档一张表中超过保留期的行，按月份写入 databases/archive/{table}-{yyyymm}.db
+    每批一个事务，避免长时间持有写锁
+    :param table: queues 或 messages
+    :param keep_days: 保留天数
+    :param batch_size: 每批行数
+    :return: 归档的行数
+    """
+    db, condition, month_expr = POLICIES[table]
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    cutoff = _cutoff(table, keep_days)
+    total = 0
+    conn = database.connect(db)
+    try:
+        while True:
+            rows = conn.execute(
+                f"SELECT id, {month_expr} FROM {table} WHERE {condition} ORDER BY id LIMIT ?",
+                (cutoff, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            months = {}
+            for id, month in rows:
+                months.setdefault(month or "unknown", []).append(id)
+            for month, ids in months.items():
+                total += _archive_batch(conn, table, month, ids)
+            if len(rows) < batch_size:
+                break
+    except sqlite3.Error as e:
+        log.error(f"归档 {table} 失败: {e}")
+    finally:
+        database.release(conn)
+    if total:
+        log.info(f"已归档 {table} {total} 行")
+    return total
+
+
+def vacuum(db: str, pages: int = 0):
+    """
+    回收空闲页：auto_vacuum 不是 INCREMENTAL 时先转换（需要一次完整 VACUUM），
+    之后每次只执行 incremental_vacuum
+    :param pages: 回收的页数，0 为全部
+    """
+    conn = database.connect(db)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            log.info(f"{db} 转换为 auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.Error as e:
+        log.error(f"{db} 回收空间失败: {e}")
+    finally:
+        database.release(conn)
+
+
+def run_retention(queue_days=None, message_days=None, batch_size=None) -> dict:
+    """
+    定时任务：归档已消费的队列消息和过期的聊天消息，然后回收空间
+    未传入的参数使用 config.yaml 的 retention 配置
+    """
+    options = Config().get_dict("retention")
+    keep = {
+        "queues": queue_days or options.get("queue_days", 7),
+        "messages": message_days or options.get("message_days", 90),
+    }
+    batch_size = batch_size or options.get("batch_size", 5000)
+    result = {}
+    for table, keep_days in keep.items():
+        result[table] = archive_table(table, keep_days, batch_size)
+        if result[table]:
+            vacuum(POLICIES[table][0])
+    return result
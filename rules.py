@@ -0,0 +1,307 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import re
+import threading
+
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+
+class Rule:
+    """permission 表中的一条触发规则（预编译）
+
+    Attributes:
+        id (int): 规则id
+        func (str): 触发的函数名
+        type (str): 消息类型，"all" 表示所有类型
+        blacklist (frozenset): 群/联系人黑名单
+        whitelist (frozenset): 群/联系人白名单
+        whitelist_all (bool): 白名单是否为 all
+        keywords (list): 关键词
+        ai_flag (int): 是否进行 AI 内容处理
+        need_at (int): 是否需要 @
+        reply (str): 回复内容
+        regex (re.Pattern): 预编译的匹配模式
+    """
+
+    __slots__ = (
+        "id",
+        "func",
+        "type",
+        "blacklist",
+        "whitelist",
+        "whitelist_all",
+        "pattern",
+        "keywords",
+        "ai_flag",
+        "need_at",
+        "reply",
+        "regex",
+    )
+
+    def __init__(self, row):
+        whitelist = row[5].split("/") if row[5] else []
+        self.id = row[0]
+        self.func = row[1] if row[1] else ""
+        self.type = str(row[6]) if row[6] else "all"
+        self.blacklist = frozenset(row[4].split("/") if row[4] else [])
+        self.whitelist = frozenset(whitelist)
+        self.whitelist_all = whitelist == ["all"]
+        self.pattern = row[7] if row[7] else ""
+        self.keywords = row[8].split("/") if row[8] else []
+        self.ai_flag = row[9]
+        self.need_at = row[10] if row[10] else 0
+        self.reply = row[11] if row[11] else ""
+        self.regex = re.compile(self.pattern, re.DOTALL)
+
+    def allows_room(self, roomid) -> bool:
+        """黑白名单检查"""
+        if roomid in self.blacklist:
+            return False
+        return self.whitelist_all or roomid in self.whitelist
+
+
+# 纯文本的整句匹配，如 ^我的课表$
+_EXACT_PATTERN = re.compile(r"\^([^.^$*+?{}\[\]\\|()]+)\$")
+# 含反向引用、条件分组或全局标志的模式不能与其他模式合并
+_STANDALONE_PATTERN = re.compile(r"\\\d|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)")
+
+
+def _anchored(pattern: str) -> bool:
+    """模式是否整体锚定在开头（以 ^ 开头且没有顶层的 |）"""
+    if not pattern.startswith(("^", "\\A")):
+        return False
+    depth = 0
+    in_class = False
+    escaped = False
+    for ch in pattern:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return False
+    return True
+
+
+class CombinedSegment:
+    """
+    连续若干条规则合并后的匹配器
+    整句文本规则使用字典查找，其余规则每 chunk_size 条合并为一个前瞻分支正则：
+    \\A(?:(?P<_r0>(?=.*?p0))|(?P<_r1>(?=.*?p1))|...)
+    分支按规则顺序尝试，命中的分支即为最先匹配的规则；以 ^ 开头的模式不加 .*?
+    分组过多时 re 回溯保存分组的开销会超过合并的收益，所以分块合并
+    """
+
+    chunk_size = 16
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.exact = {}
+        regex_rules = []
+        for index, rule in enumerate(self.rules):
+            exact = _EXACT_PATTERN.fullmatch(rule.pattern)
+            if exact:
+                self.exact.setdefault(exact.group(1), index)
+            else:
+                regex_rules.append(index)
+        # [(块内第一条规则的序号, 合并后的正则 or None, 块内规则序号)]
+        self.chunks = []
+        for start in range(0, len(regex_rules), self.chunk_size):
+            indexes = tuple(regex_rules[start : start + self.chunk_size])
+            self.chunks.append((indexes[0], self._compile(indexes), indexes))
+
+    def _compile(self, indexes):
+        branches = "|".join(
+            f"(?P<_r{i}>(?={'' if _anchored(p) else '.*?'}(?:{p})))"
+            for i, p in ((i, self.rules[i].pattern) for i in indexes)
+        )
+        try:
+            return re.compile(rf"\A(?:{branches})", re.DOTALL)
+        except re.error as e:
+            log.warning(f"规则合并失败，回退为逐条匹配: {e}")
+            return None
+
+    def first(self, content):
+        """返回最先匹配的规则"""
+        best = None
+        if self.exact:
+            best = self.exact.get(content)
+            if best is None and content.endswith("\n"):
+                best = self.exact.get(content[:-1])
+        for start, regex, indexes in self.chunks:
+            if best is not None and start > best:
+                break
+            if regex is not None:
+                m = regex.match(content)
+                index = int(m.lastgroup[2:]) if m else None
+            else:
+                index = next(
+                    (i for i in indexes if self.rules[i].regex.search(content)), None
+                )
+            if index is not None:
+                best = index if best is None else min(best, index)
+                break
+        return None if best is None else self.rules[best]
+
+
+class MultiMatcher:
+    """单个 (消息类型, 群/联系人, 是否@) 候选规则的合并匹配器"""
+
+    def __init__(self, rules):
+        self.segments = []
+        pending = []
+        for rule in rules:
+            if rule.ai_flag or _STANDALONE_PATTERN.search(rule.pattern):
+                if pending:
+                    self.segments.append(CombinedSegment(pending))
+                    pending = []
+                self.segments.append(rule)
+            else:
+                pending.append(rule)
+        if pending:
+            self.segments.append(CombinedSegment(pending))
+
+    def match(self, msg, ai_hook=None):
+        for segment in self.segments:
+            if isinstance(segment, Rule):
+                if segment.ai_flag and ai_hook:
+                    msg.content = ai_hook(msg.content, segment.keywords)
+                if segment.regex.search(msg.content):
+                    return segment
+                continue
+            rule = segment.first(msg.content)
+            if rule:
+                return rule
+        return None
+
+
+class RuleSet:
+    """一次加载得到的规则集合，加载后不再修改"""
+
+    max_buckets = 4096
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.common = tuple(r for r in self.rules if r.type == "all")
+        self.by_type = {}
+        for msg_type in {r.type for r in self.rules if r.type != "all"}:
+            self.by_type[msg_type] = tuple(
+                r for r in self.rules if r.type == "all" or r.type == msg_type
+            )
+        self._buckets = {}
+        self._matchers = {}
+
+    def bucket(self, msg_type, roomid) -> tuple:
+        """按消息类型和群/联系人过滤后的候选规则，保持原有顺序"""
+        key = (str(msg_type), roomid)
+        rules = self._buckets.get(key)
+        if rules is None:
+            candidates = self.by_type.get(key[0], self.common)
+            rules = tuple(r for r in candidates if r.allows_room(roomid))
+            if len(self._buckets) >= self.max_buckets:
+                self._buckets.clear()
+            self._buckets[key] = rules
+        return rules
+
+    def matcher(self, msg_type, roomid, is_at) -> MultiMatcher:
+        """合并匹配模式下的匹配器，need_at 规则只在被 @ 时参与匹配"""
+        key = (str(msg_type), roomid, bool(is_at))
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            rules = self.bucket(msg_type, roomid)
+            if not is_at:
+                rules = tuple(r for r in rules if not r.need_at)
+            if len(self._matchers) >= self.max_buckets:
+                self._matchers.clear()
+            matcher = self._matchers[key] = MultiMatcher(rules)
+        return matcher
+
+
+class RuleEngine:
+    """
+    触发规则引擎
+    permission 表只在规则变化（invalidate）后重新加载一次，
+    匹配模式预编译，并按消息类型、群/联系人建立索引
+    """
+
+    def __init__(self, loader, combined=False):
+        """
+        :param loader: 返回 permission 表所有行的函数
+        :param combined: 是否使用合并匹配模式
+        """
+        self._loader = loader
+        self.combined = combined
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        self._ruleset = RuleSet([])
+
+    def invalidate(self):
+        """规则发生变化，下次匹配时重新加载"""
+        self._version += 1
+
+    def set_mode(self, mode: str):
+        """设置匹配模式：sequential 逐条匹配，combined 合并匹配"""
+        self.combined = mode == "combined"
+        self.invalidate()
+
+    def ruleset(self) -> RuleSet:
+        if self._loaded_version != self._version:
+            with self._lock:
+                if self._loaded_version != self._version:
+                    version = self._version
+                    self._ruleset = self._load()
+                    self._loaded_version = version
+        return self._ruleset
+
+    def _load(self) -> RuleSet:
+        rules = []
+        for row in self._loader() or []:
+            if row[3] == 0:  # 是否禁用
+                continue
+            try:
+                rules.append(Rule(row))
+            except re.error as e:
+                log.error(f"规则 {row[0]}-{row[1]} 匹配模式错误: {e}")
+        log.info(f"已加载触发规则 {len(rules)} 条")
+        return RuleSet(rules)
+
+    def match(self, msg, ai_hook=None):
+        """
+        按规则顺序匹配消息，返回第一条匹配的规则
+        :param msg: WxMsg
+        :param ai_hook: ai_flag 规则的内容处理函数 (content, keywords) -> content
+        :return: Rule or None
+        """
+        ruleset = self.ruleset()
+        if self.combined:
+            return ruleset.matcher(msg.type, msg.roomid, msg.is_at).match(msg, ai_hook)
+        for rule in ruleset.bucket(msg.type, msg.roomid):
+            if rule.need_at and not msg.is_at:
+                continue
+            if rule.ai_flag and ai_hook:
+                msg.content = ai_hook(msg.content, rule.keywords)
+            if rule.regex.search(msg.content):
+                return rule
+        return None
+
+
+def _load_permission():
+    from models.manage.member import Member
+
+    with Member() as m:
+        return m.permission_info()
+
+
+rule_engine = RuleEngine(_load_permission)
@@ -3,23 +3,73 @@
 # @Author: Tech_T
 
 
+import asyncio
 import json
 import base64
-import requests
-import sqlite3
+import heapq
+import os
+import random
+import socket
 import time
+from collections import deque
 from datetime import datetime, timedelta
 import threading
+import uuid
 
+import database
+import jsoncodec
 from config.log import LogConfig
 from config.config import Config
 from client import Client
+from transport import transport
 
 log = LogConfig().get_logger()
 config = Config()
 base_url = config.get_config("base_url")
 static_url = config.get_config("static_url")
 
+database.register_migration(
+    "databases/queues.db",
+    1,
+    "未消费消息的部分索引",
+    [
+        "CREATE INDEX IF NOT EXISTS idx_queues_unconsumed ON queues(timestamp) WHERE is_consumed = 0"
+    ],
+)
+database.register_migration(
+    "databases/queues.db",
+    2,
+    "发送通道 priority",
+    [
+        "ALTER TABLE queues ADD COLUMN priority INTEGER DEFAULT 1",
+        "CREATE INDEX IF NOT EXISTS idx_queues_lane ON queues(priority, timestamp) WHERE is_consumed = 0",
+    ],
+)
+
+database.register_migration(
+    "databases/queues.db",
+    3,
+    "认领租约、失败重试和 queues_dead",
+    [
+        "ALTER TABLE queues ADD COLUMN claimed_by TEXT",
+        "ALTER TABLE queues ADD COLUMN lease_until REAL DEFAULT 0",
+        "ALTER TABLE queues ADD COLUMN attempts INTEGER DEFAULT 0",
+        "ALTER TABLE queues ADD COLUMN next_attempt_at REAL DEFAULT 0",
+        "ALTER TABLE queues ADD COLUMN last_error TEXT",
+        "CREATE TABLE IF NOT EXISTS queues_dead AS SELECT * FROM queues WHERE 0",
+        "ALTER TABLE queues_dead ADD COLUMN dead_at TEXT",
+    ],
+)
+
+# 发送通道，priority 列保存序号，数值越小越优先
+LANES = ("interactive", "notification", "bulk")
+
+# 移入 queues_dead 时复制的列，queues 以后新增的列不影响
+DEAD_COLUMNS = (
+    "id, is_consumed, msg_id, data, producer, p_time, consumer, c_time, timestamp, "
+    "priority, claimed_by, lease_until, attempts, next_attempt_at, last_error"
+)
+
 
 class QueueDB:
     _instance = None
@@ -41,16 +91,18 @@ class QueueDB:
         self.wxid = config.get_config("bot_wxid")
         self._local = threading.local()
         self.client = Client()  # 初始化client对象, 用于获取token, TEST
+        # 认领消息时写入 claimed_by，区分多个进程
+        self.consumer_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
 
     def __enter__(self, db="databases/queues.db"):
         if not hasattr(self._local, "connection"):
-            self._local.connection = sqlite3.connect(db)
+            self._local.connection = database.connect(db)
             self._local.cursor = self._local.connection.cursor()
         return self
 
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
         if hasattr(self._local, "connection"):
-            self._local.connection.close()
+            database.release(self._local.connection)
             del self._local.connection
             del self._local.cursor
 
@@ -78,16 +130,24 @@ class QueueDB:
         )
         self._local.connection.commit()
 
-    def __produce__(self, data: dict, consumer: str, producer: str, msg_id: str = ""):
+    def __produce__(
+        self,
+        data: dict,
+        consumer: str,
+        producer: str,
+        msg_id: str = "",
+        priority: str = "notification",
+    ):
         """
         生产消息队列
         :param msg_id: 对应微信消息的msg_id
         :param data: 消息内容
         :param producer: 消息生产者
         :param consumer: 消息消费者,api
+        :param priority: 发送通道 interactive / notification / bulk
         :return:
         """
-        data_string = json.dumps(data, ensure_ascii=False)
+        data_string = jsoncodec.dumps(data)
 
         record = {
             "msg_id": msg_id,
@@ -97,11 +157,12 @@ class QueueDB:
             "consumer": consumer,
             "c_time": "",
             "timestamp": time.time().__int__(),
+            "priority": LANES.index(priority) if priority in LANES else 1,
         }
         try:
             self._local.cursor.execute(
                 """
-            INSERT INTO queues (msg_id, data, producer, p_time, consumer, c_time, timestamp) VALUES (:msg_id, :data, :producer, :p_time, :consumer, :c_time, :timestamp)
+            INSERT INTO queues (msg_id, data, producer, p_time, consumer, c_time, timestamp, priority) VALUES (:msg_id, :data, :producer, :p_time, :consumer, :c_time, :timestamp, :priority)
             """,
                 record,
             )
@@ -111,56 +172,427 @@ class QueueDB:
 
     def __consume__(self):
         """
-        消费消息队列
+        消费消息队列（单条）
         :return:
         """
-        # 创建新的数据库连接
-        with sqlite3.connect("databases/queues.db") as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute(
-                    """
-                SELECT * FROM queues WHERE is_consumed = 0 ORDER BY timestamp ASC LIMIT 1
-                """
+        records = self.claim(1)
+        if not records:
+            return None
+        record = records[0]
+        try:
+            result = self.send(record)
+        except Exception as e:
+            log.error(f"消费消息队列失败: {e}-{record[5]}")
+            self.fail(record[0], str(e))
+            return None
+        self.mark_consumed(record[0])
+        return result
+
+    def claim(self, limit: int, priority: int = None, lease: float = 300) -> list:
+        """
+        认领可发送的消息：未消费、已到重试时间、租约已过期（没有被其他消费者持有）
+        在 BEGIN IMMEDIATE 事务中查询并写入 claimed_by/lease_until，多个进程不会认领同一条消息
+        :param limit: 最多认领的条数
+        :param priority: 只认领该通道的消息，见 LANES
+        :param lease: 租约时长（秒），到期未完成的消息可被重新认领
+        :return: [record, ...]
+        """
+        now = time.time()
+        conn = None
+        try:
+            conn = database.connect("databases/queues.db")
+            conn.execute("BEGIN IMMEDIATE")
+            sql = "SELECT * FROM queues WHERE is_consumed = 0 AND next_attempt_at <= ? AND lease_until < ?"
+            params = [now, now]
+            if priority is not None:
+                sql += " AND priority = ?"
+                params.append(priority)
+            sql += " ORDER BY priority ASC, timestamp ASC, id ASC LIMIT ?"
+            records = conn.execute(sql, (*params, limit)).fetchall()
+            conn.executemany(
+                "UPDATE queues SET claimed_by = ?, lease_until = ? WHERE id = ?",
+                [(self.consumer_id, now + lease, r[0]) for r in records],
+            )
+            conn.commit()
+            return records
+        except Exception as e:
+            log.error(f"认领消息队列失败: {e}")
+            return []
+        finally:
+            database.release(conn)
+
+    def renew(self, id: int, lease: float = 300) -> bool:
+        """发送前确认租约仍属于自己并续期，返回 False 表示消息已被其他消费者认领或已消费"""
+        try:
+            with database.connect("databases/queues.db") as conn:
+                cursor = conn.execute(
+                    "UPDATE queues SET lease_until = ? WHERE id = ? AND claimed_by = ? AND is_consumed = 0",
+                    (time.time() + lease, id, self.consumer_id),
                 )
-                record = cursor.fetchone()
-                if record:
-                    token = self.client._check_token()
-                    if not token:
-                        log.error(f"获取token失败")
-                        return None
-                    headers = {
-                        "content-type": "application/x-www-form-urlencoded; charset=utf-8",
-                        "Authorization": f"Bearer {token}",
-                    }
-                    r = requests.post(
-                        url=record[6],
-                        data=json.loads(record[3]),
-                        headers=headers,
-                        timeout=30,
-                    )
-                    r.raise_for_status()  # 修改这里：使用r而不是response
-                    if r.status_code != 200:
-                        log.error(
-                            f"发送消息失败: {r.content.decode('utf-8')}"
-                        )  # 修改这里：使用r而不是response
-                        return -1
-                    # print(r.status_code, url)
-                    c_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                    cursor.execute(
-                        """
-                    UPDATE queues SET is_consumed = 1, c_time = ? WHERE id = ?
-                    """,
-                        (c_time, record[0]),
+            return cursor.rowcount == 1
+        except Exception as e:
+            log.error(f"续期消息租约失败: {e}-{id}")
+            return False
+
+    def unclaim(self, ids) -> bool:
+        """归还认领但未发送的消息"""
+        try:
+            with database.connect("databases/queues.db") as conn:
+                conn.executemany(
+                    "UPDATE queues SET claimed_by = NULL, lease_until = 0 WHERE id = ? AND claimed_by = ? AND is_consumed = 0",
+                    [(id, self.consumer_id) for id in ids],
+                )
+            return True
+        except Exception as e:
+            log.error(f"归还消息失败: {e}")
+            return False
+
+    def _headers(self):
+        token = self.client._check_token()
+        if not token:
+            raise ValueError("获取token失败")
+        return {
+            "content-type": "application/x-www-form-urlencoded; charset=utf-8",
+            "Authorization": f"Bearer {token}",
+        }
+
+    @staticmethod
+    def _result(r):
+        r.raise_for_status()
+        if r.status_code != 200:
+            raise ValueError(f"发送消息失败: {r.content.decode('utf-8')}")
+        return r.content.decode("utf-8")
+
+    def send(self, record) -> str:
+        """
+        发送一条队列消息
+        :param record: queues 表的一行
+        :return: 响应内容，失败时抛出异常
+        """
+        r = transport.post(
+            record[6], data=jsoncodec.loads(record[3]), headers=self._headers()
+        )
+        return self._result(r)
+
+    async def asend(self, record) -> str:
+        """send 的异步版本，不阻塞事件循环"""
+        r = await transport.apost(
+            record[6], data=jsoncodec.loads(record[3]), headers=self._headers()
+        )
+        return self._result(r)
+
+    @staticmethod
+    def mark_consumed(id: int) -> bool:
+        """标记消息已消费"""
+        c_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        try:
+            with database.connect("databases/queues.db") as conn:
+                conn.execute(
+                    "UPDATE queues SET is_consumed = 1, c_time = ?, lease_until = 0 WHERE id = ?",
+                    (c_time, id),
+                )
+            return True
+        except Exception as e:
+            log.error(f"标记消息已消费失败: {e}-{id}")
+            return False
+
+    @staticmethod
+    def fail(
+        id: int, error: str, max_attempts: int = 5, backoff: float = 5, max_backoff: float = 3600
+    ) -> bool:
+        """
+        记录一次发送失败：按指数退避安排重试，失败 max_attempts 次后移入 queues_dead
+        :return: 是否已移入 queues_dead
+        """
+        conn = None
+        try:
+            conn = database.connect("databases/queues.db")
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts FROM queues WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return False
+            attempts = (row[0] or 0) + 1
+            if attempts >= max_attempts:
+                conn.execute(
+                    "UPDATE queues SET attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, id),
+                )
+                conn.execute(
+                    f"""INSERT INTO queues_dead ({DEAD_COLUMNS}, dead_at)
+                    SELECT {DEAD_COLUMNS}, ? FROM queues WHERE id = ?""",
+                    (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), id),
+                )
+                conn.execute("DELETE FROM queues WHERE id = ?", (id,))
+                log.error(f"消息 {id} 发送失败 {attempts} 次，已移入 queues_dead: {error}")
+            else:
+                delay = min(max_backoff, backoff * 2 ** (attempts - 1))
+                conn.execute(
+                    """UPDATE queues SET attempts = ?, next_attempt_at = ?, last_error = ?,
+                    claimed_by = NULL, lease_until = 0 WHERE id = ?""",
+                    (attempts, time.time() + delay, error, id),
+                )
+            conn.commit()
+            return attempts >= max_attempts
+        except Exception as e:
+            log.error(f"记录发送失败出错: {e}-{id}")
+            return False
+        finally:
+            database.release(conn)
+
+
+class WeightedSlots:
+    """
+    并发发送名额，按通道权重分配
+    名额不足时各通道排队，释放的名额按平滑加权轮询分给有等待的通道
+    """
+
+    def __init__(self, size: int, weights):
+        self.free = size
+        self.weights = tuple(weights)
+        self._waiters = [deque() for _ in self.weights]
+        self._credit = [0] * len(self.weights)
+
+    async def acquire(self, lane: int):
+        if self.free > 0 and not any(self._waiters):
+            self.free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # 已分到名额但任务被取消
+            elif future in self._waiters[lane]:
+                self._waiters[lane].remove(future)
+            raise
+
+    def release(self):
+        # 已取消、还没来得及移出队列的等待者不再分配名额
+        for waiters in self._waiters:
+            while waiters and waiters[0].done():
+                waiters.popleft()
+        lanes = [i for i, waiters in enumerate(self._waiters) if waiters]
+        if not lanes:
+            self.free += 1
+            return
+        total = 0
+        for i in lanes:
+            self._credit[i] += self.weights[i]
+            total += self.weights[i]
+        lane = max(lanes, key=lambda i: self._credit[i])
+        self._credit[lane] -= total
+        self._waiters[lane].popleft().set_result(None)
+
+
+class QueueConsumer:
+    """
+    发送队列消费者
+    每次取出一批未消费的消息，按接收人（friend_id）分组：
+    同一接收人的消息按通道优先、同一通道内按生产顺序逐条发送，不同接收人之间并行；
+    同时发送的消息不超过 workers 条，名额按通道权重（默认 6:3:1）分配；
+    pacing 是同一接收人相邻两条消息之间的随机间隔（秒），不再是全局的 sleep
+    消息先认领（租约）再发送，发送前确认租约，多个进程可以同时消费；
+    发送失败的消息按指数退避重试，不阻塞后面的消息，失败 max_attempts 次后移入 queues_dead
+    """
+
+    def __init__(
+        self,
+        workers=8,
+        batch_size=100,
+        pacing=(1, 3),
+        poll_interval=1.0,
+        limiter=None,
+        weights=(6, 3, 1),
+        lease=300,
+        max_attempts=5,
+        retry_backoff=5,
+        max_backoff=3600,
+    ):
+        """
+        :param workers: 并发发送数
+        :param batch_size: 每个通道同时取出（发送中）的消息上限
+        :param pacing: 同一接收人的发送间隔范围，同 queue_timer_random
+        :param poll_interval: 队列为空时的轮询间隔（秒）
+        :param limiter: 发送限流器 ratelimit.SendRateLimiter
+        :param weights: interactive / notification / bulk 通道的权重
+        :param lease: 认领租约时长（秒）
+        :param max_attempts: 最多发送次数
+        :param retry_backoff: 第一次重试的等待时间（秒），之后每次翻倍
+        :param max_backoff: 重试等待时间上限（秒）
+        """
+        self.queue = QueueDB()
+        self.workers = workers or 8
+        self.batch_size = batch_size or 100
+        self.pacing = tuple(pacing) if pacing else (0, 0)
+        self.poll_interval = poll_interval
+        self.limiter = limiter
+        self.weights = tuple(weights) if weights else (6, 3, 1)
+        self.lease = lease or 300
+        self.max_attempts = max_attempts or 5
+        self.retry_backoff = retry_backoff or 5
+        self.max_backoff = max_backoff or 3600
+        self._slots = None
+        self._inflight = [set() for _ in LANES]  # 各通道已取出、尚未完成的消息 id
+        self._pending = {}  # 接收人 -> [(通道, 生产时间, id, record)] 堆
+        self._active = {}  # 接收人 -> 发送任务
+        self._next_send = {}  # 接收人 -> 下一条消息最早的发送时间
+        self._latency = [deque(maxlen=1000) for _ in LANES]  # 各通道排队到发送完成的耗时
+        self._sent = [0] * len(LANES)
+        self.failed = 0
+        self.dead = 0
+
+    async def run(self):
+        self._slots = WeightedSlots(self.workers, self.weights)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                busy = False
+                for lane, inflight in enumerate(self._inflight):
+                    limit = self.batch_size - len(inflight)
+                    if limit <= 0:
+                        continue
+                    records = await asyncio.to_thread(
+                        self.queue.claim, limit, lane, self.lease
                     )
-                    conn.commit()
-                    return r.content.decode("utf-8")  # 修改这里：使用r而不是response
-            except Exception as e:
-                log.error(f'消费消息队列失败: {e}-{record[5] if record else ""}')
-                return None
+                    self._dispatch(records)
+                    busy = busy or len(records) == limit
+                now = loop.time()
+                self._next_send = {k: v for k, v in self._next_send.items() if v > now}
+                await asyncio.sleep(0 if busy else self.poll_interval)
+        finally:
+            tasks = list(self._active.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 归还未发送的消息，其他消费者不必等租约到期
+            ids = [id for inflight in self._inflight for id in inflight]
+            if ids:
+                await asyncio.to_thread(self.queue.unclaim, ids)
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane, name in enumerate(LANES):
+            latency = sorted(self._latency[lane])
+            lanes[name] = {
+                "inflight": len(self._inflight[lane]),
+                "sent": self._sent[lane],
+                "latency_p50": latency[len(latency) // 2] if latency else None,
+                "latency_p95": latency[int(len(latency) * 0.95)] if latency else None,
+            }
+        stats = {
+            "receivers": len(self._active),
+            "sent": sum(self._sent),
+            "failed": self.failed,
+            "dead": self.dead,
+            "lanes": lanes,
+        }
+        if self.limiter:
+            stats["rate_limit"] = self.limiter.stats()
+        return stats
+
+    @staticmethod
+    def _receiver(record) -> str:
+        try:
+            return str(jsoncodec.loads(record[3]).get("friend_id", ""))
+        except (ValueError, AttributeError):
+            return ""
 
+    @staticmethod
+    def _lane(record) -> int:
+        lane = record[9]
+        return lane if lane in range(len(LANES)) else LANES.index("notification")
+
+    def _release(self, pending):
+        for lane, _, id, _ in pending:
+            self._inflight[lane].discard(id)
+
+    def _dispatch(self, records):
+        for record in records:
+            lane = self._lane(record)
+            if record[0] in self._inflight[lane]:
+                continue  # 租约到期后被自己重新认领
+            self._inflight[lane].add(record[0])
+            receiver = self._receiver(record)
+            heapq.heappush(
+                self._pending.setdefault(receiver, []),
+                (lane, record[8] or 0, record[0], record),
+            )
+            if receiver not in self._active:
+                self._active[receiver] = asyncio.create_task(self._drain(receiver))
+
+    async def _drain(self, receiver):
+        """按顺序发送一个接收人的消息"""
+        loop = asyncio.get_running_loop()
+        pending = self._pending[receiver]
+        entry = None
+        try:
+            while pending:
+                delay = self._next_send.get(receiver, 0) - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.limiter:
+                    await self.limiter.acquire_receiver(receiver)
+                # 等待期间可能加入了更高优先级的消息，这里再取
+                entry = heapq.heappop(pending)
+                lane, _, id, record = entry
+                await self._slots.acquire(lane)
+                try:
+                    if self.limiter:
+                        await self.limiter.acquire_global()
+                    sent = await self._send(record)
+                finally:
+                    self._slots.release()
+                entry = None
+                self._next_send[receiver] = loop.time() + random.uniform(*self.pacing)
+                self._inflight[lane].discard(id)
+                if sent:
+                    self._sent[lane] += 1
+                    self._latency[lane].append(round(time.time() - (record[8] or 0), 3))
+        finally:
+            self._active.pop(receiver, None)
+            if entry is not None:
+                self._release([entry])
+            if self._pending.get(receiver) is pending:
+                self._release(pending)
+                del self._pending[receiver]
 
-def send_text(content: str, receiver: str, aters: str = "", producer: str = "main"):
+    async def _send(self, record):
+        """发送一条消息，返回是否发送成功"""
+        if not await asyncio.to_thread(self.queue.renew, record[0], self.lease):
+            log.warning(f"消息 {record[0]} 的租约已失效，跳过")
+            return False
+        try:
+            await self.queue.asend(record)
+        except Exception as e:
+            log.error(f"消费消息队列失败: {e}-{record[5]}")
+            if self.limiter:
+                self.limiter.on_error()
+            self.failed += 1
+            dead = await asyncio.to_thread(
+                self.queue.fail,
+                record[0],
+                str(e),
+                self.max_attempts,
+                self.retry_backoff,
+                self.max_backoff,
+            )
+            self.dead += dead
+            return False
+        if self.limiter:
+            self.limiter.on_success()
+        await asyncio.to_thread(self.queue.mark_consumed, record[0])
+        return True
+
+
+def send_text(
+    content: str,
+    receiver: str,
+    aters: str = "",
+    producer: str = "main",
+    priority: str = "notification",
+):
     """发送文本消息"""
     data = {
         "friend_id": receiver,
@@ -169,20 +601,34 @@ def send_text(content: str, receiver: str, aters: str = "", producer: str = "mai
         "content_type": 1,
     }
     with QueueDB() as queue:  # 使用上下文管理器
-        queue.__produce__(data, base_url + "send_message_250514.html", producer)
+        queue.__produce__(
+            data, base_url + "send_message_250514.html", producer, priority=priority
+        )
 
 
-def send_image(path: str = "", receiver: str = "", producer: str = "main"):
+def send_image(
+    path: str = "",
+    receiver: str = "",
+    producer: str = "main",
+    priority: str = "notification",
+):
     """发送图片消息"""
     # 处理path
     if not (path.startswith("http://") or path.startswith("https://")):
         path = static_url + path
     data = {"friend_id": receiver, "message": path, "content_type": 2}
     with QueueDB() as queue:  # 使用上下文管理器
-        queue.__produce__(data, base_url + "send_message_250514.html", producer)
+        queue.__produce__(
+            data, base_url + "send_message_250514.html", producer, priority=priority
+        )
 
 
-def send_file(file_dict, receiver: str = "", producer: str = "main"):
+def send_file(
+    file_dict,
+    receiver: str = "",
+    producer: str = "main",
+    priority: str = "notification",
+):
     """发送文件消息"""
     # 处理字符串类型的参数
     if isinstance(file_dict, str):
@@ -201,10 +647,18 @@ def send_file(file_dict, receiver: str = "", producer: str = "main"):
         "message": json.dumps(file_dict),
     }
     with QueueDB() as queue:  # 使用上下文管理器
-        queue.__produce__(data, base_url + "send_message_250514.html", producer)
+        queue.__produce__(
+            data, base_url + "send_message_250514.html", producer, priority=priority
+        )
 
 
-def send_app_msg(xml_dict: dict, receiver: str, type: int = 13, producer: str = "main"):
+def send_app_msg(
+    xml_dict: dict,
+    receiver: str,
+    type: int = 13,
+    producer: str = "main",
+    priority: str = "notification",
+):
     """发送应用消息"""
     data = {
         "friend_id": receiver,
@@ -212,11 +666,14 @@ def send_app_msg(xml_dict: dict, receiver: str, type: int = 13, producer: str =
         "message": json.dumps(xml_dict),
     }
     with QueueDB() as queue:  # 使用上下文管理器
-        queue.__produce__(data, base_url + "send_message_250514.html", producer)
+        queue.__produce__(
+            data, base_url + "send_message_250514.html", producer, priority=priority
+        )
 
 
 if __name__ == "__main__":
     db = QueueDB()
     db.__enter__()
     db.__create_table__()
+    database.migrate("databases/queues.db")
     print("Done!")
@@ -0,0 +1,143 @@
+# _*_ coding: utf-8 _*_
+# @Time: 2026/10/17
+
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
+from config.config import Config
+from config.log import LogConfig
+
+log = LogConfig().get_logger()
+
+# 请求未被上游处理的异常，可以安全重试
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class Transport:
+    """
+    上游接口的 HTTP 连接池
+    同步和异步各一个长连接客户端，限制连接数，请求超时，
+    连接失败或上游繁忙（retry_statuses）时按指数退避重试
+    发送消息的 POST 不是幂等的，读超时等已发出的请求不重试
+    """
+
+    def __init__(
+        self,
+        max_connections=20,
+        max_keepalive=10,
+        timeout=30,
+        connect_timeout=5,
+        retries=2,
+        backoff=0.5,
+        retry_statuses=(429, 503),
+    ):
+        """
+        :param max_connections: 最大连接数
+        :param max_keepalive: 保持的空闲连接数
+        :param timeout: 请求超时（秒）
+        :param connect_timeout: 建立连接超时（秒）
+        :param retries: 最多重试次数
+        :param backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+        :param retry_statuses: 需要重试的响应状态码
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_statuses = frozenset(retry_statuses)
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+
+    @classmethod
+    def from_config(cls):
+        """使用 config.yaml 中的 http 配置"""
+        options = Config().get_dict("http")
+        return cls(**options)
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout
+            )
+        return self._async_client
+
+    def _delay(self, attempt: int) -> float:
+        return self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """同步请求（供原有的同步调用使用）"""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.request(method, url, **kwargs)
+                if (
+                    response.status_code not in self.retry_statuses
+                    or attempt == self.retries
+                ):
+                    return response
+                log.warning(f"上游繁忙，准备重试: {url} {response.status_code}")
+            except RETRY_EXCEPTIONS as e:
+                if attempt == self.retries:
+                    raise
+                log.warning(f"请求失败，准备重试: {url} {e}")
+            time.sleep(self._delay(attempt))
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """异步请求"""
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.async_client.request(method, url, **kwargs)
+                if (
+                    response.status_code not in self.retry_statuses
+                    or attempt == self.retries
+                ):
+                    return response
+                log.warning(f"上游繁忙，准备重试: {url} {response.status_code}")
+            except RETRY_EXCEPTIONS as e:
+                if attempt == self.retries:
+                    raise
+                log.warning(f"请求失败，准备重试: {url} {e}")
+            await asyncio.sleep(self._delay(attempt))
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self.close()
+
+
+transport = Transport.from_config()
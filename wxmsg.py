@@ -1,10 +1,17 @@
+import asyncio
 import json
+from collections import OrderedDict
 from datetime import datetime
+import threading
 import time
 import re
-import sqlite3
+import database
+import jsoncodec
+from config.log import LogConfig
 from models.manage.member import Member
 
+log = LogConfig().get_logger()
+
 
 def process_nested_dict(d):
     """处理嵌套的字典，尝试解析可能是JSON的字符串"""
@@ -22,7 +29,7 @@ def process_nested_dict(d):
         ):
             # 尝试解析可能是JSON的字符串
             try:
-                json_obj = json.loads(v)
+                json_obj = jsoncodec.loads(v)
                 if isinstance(json_obj, dict):
                     d[k] = process_nested_dict(json_obj)
             except json.JSONDecodeError:
@@ -31,6 +38,41 @@ def process_nested_dict(d):
     return d
 
 
+def loads_nested(value):
+    """解析看起来是 JSON 对象的字符串，与 process_nested_dict 对单个字段的处理相同"""
+    if isinstance(value, dict):
+        return process_nested_dict(value)
+    if (
+        isinstance(value, str)
+        and value
+        and value.strip().startswith("{")
+        and value.strip().endswith("}")
+    ):
+        try:
+            json_obj = jsoncodec.loads(value)
+            if isinstance(json_obj, dict):
+                return process_nested_dict(json_obj)
+        except json.JSONDecodeError:
+            pass
+    return value
+
+
+def _decoded_field(slot):
+    """WxMsg 中依赖消息内容的字段，第一次读写时先解析消息内容"""
+
+    def fget(self):
+        if not self._decoded:
+            self._decode()
+        return getattr(self, slot)
+
+    def fset(self, value):
+        if not self._decoded:
+            self._decode()
+        setattr(self, slot, value)
+
+    return property(fget, fset)
+
+
 def filter_msg(msg):
     if not msg:
         return None
@@ -58,14 +100,30 @@ class WxMsg:
         thumb (str): 消息缩略图
     """
 
+    __slots__ = (
+        "wxid",
+        "roomid",
+        "is_self",
+        "is_group",
+        "type",
+        "msg_id",
+        "create_time",
+        "_content",
+        "_sender",
+        "_ext",
+        "_thumb",
+        "_at",
+        "_decoded",
+    )
+
     def __init__(self, msg) -> None:
-        # 确保输入是处理过的字典
-        if isinstance(msg, dict):
-            msg = filter_msg(msg)
+        # 只解析消息头，content/ext 在第一次访问时才解析（见 _decode）
         type = msg.get("type", "")
         if type == "callback":
+            self._decoded = True
             self.event_callback(msg)
         else:
+            self._decoded = False
             self.formate_msg(msg)
 
     def formate_msg(self, msg):
@@ -73,15 +131,28 @@ class WxMsg:
         self.roomid = msg.get("friendid", "")
         self.is_self = True if msg.get("issend", "false") == "true" else False
         self.is_group = 1 if "@chatroom" in self.roomid else 0
-        self.content = msg.get("content", "")
+        self._content = msg.get("content", "")
         self.type = msg.get("contenttype", 0)
         self.msg_id = msg.get("msgsvrid", "")
         self.create_time = msg.get("createTime", 0)
-        self.ext = msg.get("ext", "")
-        self.thumb = ""
-        self.is_at = self._is_at()
+        self._ext = msg.get("ext", "")
+        self._thumb = ""
+        self._sender = ""
+
+    def _decode(self):
+        """解析消息内容：content/ext 中的 JSON，发送人，按消息类型处理"""
+        self._decoded = True
+        self._content = loads_nested(self._content)
+        self._ext = loads_nested(self._ext)
+        self._at = self._is_at()
         self.parse_content()
 
+    content = _decoded_field("_content")
+    sender = _decoded_field("_sender")
+    ext = _decoded_field("_ext")
+    thumb = _decoded_field("_thumb")
+    is_at = _decoded_field("_at")
+
     def event_callback(self, msg):
         """事件回调"""
         self.wxid = msg.get("wxId", "")
@@ -91,7 +162,7 @@ class WxMsg:
         self.type = msg.get("type", "")
         self.create_time = time.time() * 1000
         self.is_at = False
-        bizContent = msg.get("bizContent", "")
+        bizContent = loads_nested(msg.get("bizContent", ""))
         self.ext = bizContent.get("QrCodeUrl", "")
         self.msg_id = bizContent.get("TaskId", "")
         self.roomid = bizContent.get("ChatRoomId", "")
@@ -107,7 +178,7 @@ class WxMsg:
                 if len(parts) > 1 and "{" == parts[1][0]:
                     self.sender = parts[0]
                     try:
-                        json_content = json.loads(parts[1])
+                        json_content = jsoncodec.loads(parts[1])
                         self.content = process_nested_dict(json_content)
                         self.thumb = json_content.get("Thumb", "")
                     except:
@@ -182,7 +253,7 @@ class WxMsg:
                 content
                 if not self.is_group
                 else (
-                    json.loads(content.split(f"{self.sender}:")[1])
+                    jsoncodec.loads(content.split(f"{self.sender}:")[1])
                     if isinstance(content, str) and ":{\"Thumb" in content
                     else content
                 )
@@ -535,17 +606,25 @@ class WxMsg:
         return True
 
 
+database.register_migration(
+    "databases/messages.db",
+    1,
+    "messages.msg_id 索引",
+    ["CREATE INDEX IF NOT EXISTS idx_messages_msg_id ON messages(msg_id)"],
+)
+
+
 class MessageDB:
     """消息数据库"""
 
     def __enter__(self, db="databases/messages.db"):
-        self.__conn__ = sqlite3.connect(db)
+        self.__conn__ = database.connect(db)
         self.__cursor__ = self.__conn__.cursor()
         return self
 
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
-        self.__conn__.commit()
-        self.__conn__.close()
+        # 出错时回滚，避免部分写入的批次被提交后重试时重复写入
+        database.release(self.__conn__, commit=exc_type is None)
 
     def __create_table__(self):
         self.__cursor__.execute(
@@ -576,6 +655,15 @@ class MessageDB:
         )
         self.__conn__.commit()
 
+    def insert_many(self, msgs):
+        """批量插入，与 __exit__ 的 commit 在同一个事务中"""
+        self.__cursor__.executemany(
+            """
+            INSERT INTO messages(wxid, msg_id, type, sender, roomid, content, thumb, ext, is_at, is_self, is_group, create_time)
+            VALUES(:wxid, :msg_id, :type, :sender, :roomid, :content, :thumb, :ext, :is_at, :is_self, :is_group, :create_time)""",
+            msgs,
+        )
+
     def select(self, msg_id):
         self.__cursor__.execute(
             """
@@ -586,8 +674,193 @@ class MessageDB:
         return result if result else None
 
 
+class MessageWriter:
+    """
+    消息异步批量写入
+    webhook 只把 WxMsg.__to_dict__() 放入队列，后台任务每 batch_size 条
+    或每 flush_ms 毫秒用 executemany 在一个事务中写入 messages.db
+    写入失败（如 database is locked）时整批重试一次，仍失败则逐条写入，只丢弃写不进去的消息
+    """
+
+    def __init__(self, batch_size=200, flush_ms=500, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_queue = max_queue
+        self._queue = None
+        self._full = None
+        self._pending = []
+        self._task = None
+        self.rows_written = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.dropped = 0
+
+    def start(self, batch_size=None, flush_ms=None):
+        """在事件循环中启动后台写入任务"""
+        if batch_size:
+            self.batch_size = batch_size
+        if flush_ms:
+            self.flush_ms = flush_ms
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并写入队列中剩余的消息"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._queue is not None:
+            batch, self._pending = self._pending, []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await asyncio.to_thread(self._write, batch)
+            log.info(f"消息写入已停止，共写入{self.rows_written}条")
+
+    def put(self, msg: dict):
+        """放入写入队列；未启动或队列已满时直接同步写入"""
+        if self._task is None:
+            self._write([msg])
+            return
+        try:
+            self._queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            log.warning("消息写入队列已满，同步写入")
+            self._write([msg])
+            return
+        if self._queue.qsize() >= self.batch_size - 1:
+            self._full.set()
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "dropped": self.dropped,
+        }
+
+    async def _run(self):
+        while True:
+            self._pending = [await self._queue.get()]
+            if self._queue.qsize() < self.batch_size - 1:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            while len(self._pending) < self.batch_size and not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+            batch, self._pending = self._pending, []
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch):
+        """写入一批消息，失败时整批重试一次，再失败则逐条写入"""
+        for attempt in range(2):
+            try:
+                self._flush(batch)
+                return
+            except Exception as e:
+                log.warning(f"批量写入消息失败({attempt + 1}/2): {e}")
+        if len(batch) == 1:
+            self.dropped += 1
+            log.error(f"写入消息失败，丢弃: {batch[0].get('msg_id')}")
+            return
+        for msg in batch:
+            try:
+                self._flush([msg])
+            except Exception as e:
+                self.dropped += 1
+                log.error(f"写入消息失败，丢弃: {msg.get('msg_id')}, {e}")
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        with MessageDB() as db:
+            db.insert_many(batch)
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        self.rows_written += len(batch)
+        self.flushes += 1
+
+
+message_writer = MessageWriter()
+
+
+class MessageWaiters:
+    """
+    等待指定 msg_id 的消息（如触发获取群二维码后，等待回调消息）
+    main.root 收到消息时调用 resolve，等待方立即拿到 WxMsg，不需要轮询数据库
+    最近 keep 条消息保留在内存中，消息比 wait 先到也能拿到
+    msg_id 统一按字符串比较：接口返回的 id 和回调中解析出的 id 可能一个是 int、一个是 str
+    """
+
+    def __init__(self, keep=256):
+        self.keep = keep
+        self._waiters = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def wait(self, msg_id, timeout=30):
+        """
+        等待 msg_id 对应的消息
+        :return: WxMsg，超时返回 None
+        """
+        msg_id = str(msg_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            msg = self._recent.get(msg_id)
+            if msg is not None:
+                return msg
+            self._waiters.setdefault(msg_id, []).append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(msg_id, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                if not waiters:
+                    self._waiters.pop(msg_id, None)
+
+    def resolve(self, msg):
+        """收到消息，唤醒等待该 msg_id 的协程（可在任意线程调用）"""
+        if not msg.msg_id:
+            return
+        msg_id = str(msg.msg_id)
+        with self._lock:
+            self._recent[msg_id] = msg
+            self._recent.move_to_end(msg_id)
+            while len(self._recent) > self.keep:
+                self._recent.popitem(last=False)
+            waiters = self._waiters.pop(msg_id, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._set_result, future, msg)
+
+    @staticmethod
+    def _set_result(future, msg):
+        if not future.done():
+            future.set_result(msg)
+
+    def pending(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+
+message_waiters = MessageWaiters()
+
+
 if __name__ == "__main__":
     m = MessageDB()
     m.__enter__()
     m.__create_table__()
     m.__exit__()
+    database.migrate("databases/messages.db")